@@ -0,0 +1,94 @@
+import heapq
+import logging
+import threading
+
+import parsers
+
+
+class AlocadorOnuId:
+    # Carrega os IDs usados de cada PON uma vez e distribui os livres localmente (menor ID primeiro)
+    def __init__(self, maximo=128, olt="padrao"):
+        self.olt = olt
+        self.maximo = maximo
+        self.consultas_olt = 0
+        self._usados = {}
+        self._livres = {}
+        self._pendentes = {}
+        self._locks_pon = {}
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        with self._lock:
+            self._usados = {}
+            self._livres = {}
+            self._pendentes = {}
+            self._locks_pon = {}
+
+    def _lock_pon(self, pon):
+        # Um lock por PON: carregar uma PON na OLT não trava a alocação nas outras
+        with self._lock:
+            return self._locks_pon.setdefault(pon, threading.Lock())
+
+    def comandos(self, pon):
+        return ["configure terminal", f"show gpon onu state gpon_olt-{pon}", "exit"]
+
+    def carregada(self, pon):
+        return pon in self._livres
+
+    def carregar(self, pon, saida):
+        # `saida` é o "show gpon onu state" da PON, lido por quem chama
+        with self._lock_pon(pon):
+            self._aplicar(pon, saida)
+
+    def _aplicar(self, pon, saida):
+        self.consultas_olt += 1
+        usados = ids_usados(saida) | self._pendentes.get(pon, set())
+        livres = [i for i in range(1, self.maximo + 1) if i not in usados]
+        heapq.heapify(livres)
+        self._usados[pon] = usados
+        self._livres[pon] = livres
+        self._pendentes.setdefault(pon, set())
+        logging.info(f"OLT {self.olt}, PON {pon}: {len(usados)} IDs em uso, {len(livres)} livres")
+
+    def reservar(self, pon):
+        with self._lock_pon(pon):
+            if pon not in self._livres:
+                raise ValueError(f"PON {pon} da OLT {self.olt} ainda não foi carregada")
+            livres = self._livres[pon]
+            if not livres:
+                return None
+            onu_id = heapq.heappop(livres)
+            self._usados[pon].add(onu_id)
+            self._pendentes[pon].add(onu_id)
+            return onu_id
+
+    def ocupado(self, pon, onu_id):
+        # Pela última leitura da PON (precisa estar carregada), sem ir na OLT
+        return onu_id in self._usados.get(pon, set())
+
+    def confirmar(self, pon, onu_id):
+        with self._lock_pon(pon):
+            self._pendentes.get(pon, set()).discard(onu_id)
+
+    def liberar(self, pon, onu_id):
+        # Autorização falhou sem ocupar o ID na OLT: devolve pra fila
+        with self._lock_pon(pon):
+            if onu_id in self._pendentes.get(pon, set()):
+                self._pendentes[pon].discard(onu_id)
+                self._usados[pon].discard(onu_id)
+                heapq.heappush(self._livres[pon], onu_id)
+
+    def conflito(self, pon, onu_id, saida):
+        # Registro falhou: com a PON relida (`saida` do "show gpon onu state"), diz se o ID já estava
+        # ocupado por outra ONU
+        with self._lock_pon(pon):
+            self._pendentes.get(pon, set()).discard(onu_id)
+            self._aplicar(pon, saida)
+            ocupado = onu_id in self._usados[pon]
+        if ocupado:
+            logging.warning(f"ID {onu_id} já estava em uso na PON {pon} da OLT {self.olt}, IDs recarregados")
+        return ocupado
+
+
+def ids_usados(saida):
+    return {onu.onu_id for onu in parsers.parse_estado_onus(saida)}
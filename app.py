@@ -1,219 +1,587 @@
-import paramiko
-import pandas as pd
-import openpyxl
+import asyncio
 import logging
 import os
-import time
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 
+import descoberta
+import diario
+import falhas
+import inventario
+import leitor
+import metricas
+import parsers
+import perfis
+import planejamento
+from progresso import Progresso
+import transcricao
+import verificacao
+
 load_dotenv()
 
-def executar_comando_ssh(comandos):
-    host = os.getenv("OLT_HOST")
-    port = int(os.getenv("OLT_PORT"))
-    username = os.getenv("OLT_USERNAME")
-    password = os.getenv("OLT_PASSWORD")
+# Envia os scripts de autorização em lote num write só (desligar se o firmware descartar o que foi digitado antes do prompt)
+PIPELINE = os.getenv("OLT_PIPELINE", "1") == "1"
+# Confere no planejamento se o name da planilha já existe na OLT (um "show running-config" filtrado por OLT)
+CONFERIR_NOMES = os.getenv("OLT_CONFERIR_NOMES", "1") == "1"
+# Scripts que não podem ir duas vezes pra OLT: só são repetidos se a sessão nem chegou a abrir.
+# O de serviço pode, ele só regrava os mesmos valores nas interfaces da ONU.
+ETAPAS_NAO_IDEMPOTENTES = {"registro"}
+# Rodadas de registro por lote: a primeira e até duas pra ID ocupado ou falha transitória
+RODADAS_REGISTRO = 3
+# Pools, caches de uncfg, alocadores e disjuntores das OLTs (inventario), o relatório de tempos e a
+# transcrição são do processo: duas migrações juntas no mesmo processo se atropelariam, então roda uma por vez
+_migracao = threading.Lock()
+ESPERA_MIGRACAO = 0.5
 
-    try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host, port=port, username=username, password=password)
+async def executar_comandos_async(comandos, pipeline=False, olt=None, idempotente=True):
+    # Uma saída por comando; erros de conexão/timeout sobem como exceção tipada (falhas.ErroOLT),
+    # depois das novas tentativas. `olt` é o nome no inventário; sem nome vai pra OLT padrão.
+    return await inventario.obter(olt).executar_async(comandos, pipeline=pipeline and PIPELINE, idempotente=idempotente)
 
-        shell = ssh.invoke_shell()
-        output = ""
+async def fotografar_olt_async(olt=None):
+    # Planejamento: uma leitura do uncfg e uma dos nomes por OLT servem pra planilha inteira.
+    # Retorna os nomes já usados na OLT (vazio se a conferência estiver desligada).
+    dispositivo = inventario.obter(olt)
+    with metricas.etapa("descoberta_uncfg", olt=dispositivo.nome):
+        saidas = await executar_comandos_async(descoberta.COMANDOS, olt=olt)
+    dispositivo.cache_uncfg.atualizar(saidas[1])
+    if not CONFERIR_NOMES:
+        return set()
+    with metricas.etapa("consulta_nomes", olt=dispositivo.nome):
+        saidas = await executar_comandos_async(planejamento.COMANDOS_NOMES, olt=olt)
+    nomes = parsers.parse_nomes(saidas[1])
+    logging.info(f"OLT {dispositivo.nome}: {len(nomes)} nomes de ONU já em uso")
+    return nomes
 
-        for comando in comandos:
-            shell.send(f"{comando}\n")
-            time.sleep(1)  # Delay maior para dar tempo ao comando executar
-            
-            # Ler toda a saída disponível e lidar com paginação
-            max_attempts = 10
-            attempt = 0
-            while attempt < max_attempts:
-                if shell.recv_ready():
-                    chunk = shell.recv(4096).decode('utf-8')
-                    output += chunk
-                    
-                    # Se encontrar "--More--", enviar espaço para continuar
-                    if "--More--" in chunk:
-                        shell.send(" ")
-                        time.sleep(0.5)
-                    else:
-                        time.sleep(0.3)
-                else:
-                    break
-                attempt += 1
+async def planejar_ids_async(pon, onus, olt=None):
+    # Reserva no alocador um ID pra cada ONU da PON, na ordem da planilha; a execução usa esses IDs.
+    # Retorna o motivo por ONU que ficou sem ID (None pra quem foi planejada).
+    alocador_ids = inventario.obter(olt).alocador
+    try:
+        if not alocador_ids.carregada(pon):
+            with metricas.etapa("consulta_ids", olt=inventario.obter(olt).nome, pon=pon):
+                saidas = await executar_comandos_async(alocador_ids.comandos(pon), olt=olt)
+            alocador_ids.carregar(pon, saidas[1])
+    except Exception as e:
+        logging.error(f"Erro ao listar as ONUs da PON {pon}: {e}")
+        return [f"Erro ao listar as ONUs da PON {pon}: {str(e)}"] * len(onus)
+    motivos = []
+    for onu in onus:
+        if onu.get('registrada'):
+            # Retomada: a ONU tem que continuar no ID anotado no diário. O "show gpon onu state" diz se
+            # o ID está ocupado, o detail-info diz por quem; serviço em ID de outra ONU nunca
+            if not alocador_ids.ocupado(pon, onu['onu_id']):
+                motivos.append(f"ONU fora do uncfg e ID {onu['onu_id']} livre na PON {pon}.")
+                continue
+            try:
+                saidas = await executar_comandos_async(
+                    ["configure terminal", f"show gpon onu detail-info gpon_onu-{pon}:{onu['onu_id']}", "exit"], olt=olt)
+                serial = parsers.parse_serial_detalhe(saidas[1])
+            except Exception as e:
+                logging.error(f"Erro ao consultar a ONU {pon}:{onu['onu_id']}: {e}")
+                motivos.append(f"Erro ao consultar a ONU {pon}:{onu['onu_id']}: {str(e)}")
+                continue
+            ok = serial == onu['serial']
+            motivos.append(None if ok else f"ID {onu['onu_id']} da PON {pon} está com a ONU {serial}, não com esta.")
+            continue
+        onu['onu_id'] = alocador_ids.reservar(pon)
+        motivos.append(None if onu['onu_id'] is not None else f"Sem ID de ONU disponível na PON {pon}.")
+    return motivos
 
-        # Aguardar um pouco mais para garantir que toda a saída foi recebida
-        time.sleep(1)
-        if shell.recv_ready():
-            output += shell.recv(4096).decode('utf-8')
+async def autorizar_onu_async(onu, diario_execucao=None):
+    erro = validar_onu(onu)
+    if erro is not None:
+        return erro
+    # Uma ONU sozinha é um lote de tamanho 1: registra primeiro e só configura serviço se o ID ficou com ela
+    return (await autorizar_lote_pon_async(onu['pon'], [onu], diario_execucao, olt=onu.get('olt')))[0]
 
-        ssh.close()
-        logging.info(f"Saída completa dos comandos: {output}")
-        return output
-    except Exception as e:
-        logging.error(f"Erro ao conectar à OLT: {e}")
-        return f"Erro: {str(e)}"
-
-def buscar_ultimo_onu_numero(pon):
-    comando_listar_onus = [
-        "configure terminal",
-        f"show gpon onu state gpon_olt-{pon}",
-        "exit"
-    ]
-    logging.info(f"Executando comando para buscar o próximo número de ONU disponível na PON: {comando_listar_onus}")
-    
-    resultado_listagem = executar_comando_ssh(comando_listar_onus)
-
-    if resultado_listagem:
-        linhas = resultado_listagem.splitlines()
-        logging.info(f"Resultado da listagem de ONUs: {linhas}")
-
-        numeros_onu_usados = set()
-        for linha in linhas:
-            if "enable" in linha:
-                try:
-                    numero_onu = int(linha.split(":")[1].split()[0])
-                    numeros_onu_usados.add(numero_onu)
-                except (ValueError, IndexError):
-                    logging.warning(f"Não foi possível extrair o número da ONU: {linha}")
-
-        if numeros_onu_usados:
-            # Encontrar o primeiro número disponível para servir de ID para onu ( isso é trabalhosooo aaa)
-            for i in range(1, max(numeros_onu_usados) + 2):
-                if i not in numeros_onu_usados:
-                    logging.info(f"Próximo número disponível para ONU: {i}")
-                    return i
-
-    logging.warning(f"Nenhum número de ONU encontrado na PON {pon}, retornando 1")
-    return 1  # Se não houver ONUs, retorna 1 como número inicial e continua a brincadeira
-
-def buscar_pon_olt(serial):
-    comando_verificar_onu = [
-        "configure terminal",
-        "show pon onu uncfg",
-        "exit"
-    ]
-    resultado = executar_comando_ssh(comando_verificar_onu)
-
-    if resultado:
-        for linha in resultado.splitlines():
-            if serial.upper() in linha.upper():
-                partes = linha.split()
-                pon = partes[0].replace("gpon_olt-", "")
-                logging.info(f"PON encontrada para o serial {serial}: {pon}")
-                return pon
-    logging.warning(f"PON não encontrada para o serial {serial}")
+def validar_onu(onu):
+    erro = planejamento.validar_pon(onu['pon'])
+    if erro is not None:
+        logging.error(f"{erro} ONU {onu['serial']}, PON {onu['pon']}.")
+        return {"message": erro}, 400
     return None
 
-def autorizar_onu(onu):
-    if not onu['pon']:
-        logging.error(f"PON inválida para a ONU {onu['serial']}.")
-        return {"message": "PON inválida."}, 400
-    
-    pon_components = onu['pon'].split('/')
-    if len(pon_components) != 3:
-        logging.error(f"Formato de PON inválido: {onu['pon']}.")
-        return {"message": "Formato de PON inválido."}, 400
-
-    slot, pon_card, pon_port = pon_components
-    ultimo_onu_numero = buscar_ultimo_onu_numero(f"{slot}/{pon_card}/{pon_port}")
-
-    logging.info(f"Slot: {slot}, Pon Card: {pon_card}, Pon Port: {pon_port}, Próximo ONU Número: {ultimo_onu_numero}")
-
-    comandos_autorizacao = [
-        "configure terminal",
-        f"interface gpon_olt-{slot}/{pon_card}/{pon_port}",
-        f"onu {ultimo_onu_numero} type Bridge sn {onu['serial']}",
-        "exit",
-        f"interface gpon_onu-{slot}/{pon_card}/{pon_port}:{ultimo_onu_numero}",
-        f"name {onu['name']}",
-        "vport-mode manual",
-        "tcont 1 profile PLANO-500M",
-        "gemport 1 tcont 1",
-        "vport 1 map-type vlan",
-        "vport-map 1 1 vlan 2003",
-        "exit",
-        f"pon-onu-mng gpon_onu-{slot}/{pon_card}/{pon_port}:{ultimo_onu_numero}",
-        "service 1 gemport 1 vlan 2003",
-        "vlan port eth_0/1 mode tag vlan 2003",
-        "exit",
-        f"interface vport-{slot}/{pon_card}/{pon_port}.{ultimo_onu_numero}:1",
-        "service-port 1 user-vlan 2003 vlan 2003",
-        "exit",
-        "exit"  # missao cumprida exit
-    ]
-    
-    resultado_autorizacao = executar_comando_ssh(comandos_autorizacao)
-    logging.info(f"Resultado da autorização: {resultado_autorizacao}")
-
-    if "Error" in resultado_autorizacao:
-        logging.error(f"Erro na autorização da ONU: {resultado_autorizacao}")
-        return {"message": f"Erro na autorização da ONU: {resultado_autorizacao}"}, 500
-    else:
-        return {"message": f"ONU {onu['serial']} autorizada com sucesso!"}, 200
-
-def processar_planilha(arquivo_excel):
+def comando_registro(onu_id, onu):
+    # Tipo da ONU e script de serviço vêm do perfil da linha (perfis.json); sem perfil, o padrão
+    return perfis.obter(onu.get('perfil')).registro(onu_id, onu['serial'])
+
+def montar_script_onu(pon, onu_id, onu):
+    # Script completo de uma ONU (registro + serviço), como aparece no plano; a já registrada só tem o serviço
+    slot, pon_card, pon_port = pon.split('/')
+    registro = [] if onu.get('registrada') else [f"interface gpon_olt-{pon}", comando_registro(onu_id, onu), "exit"]
+    return ["configure terminal"] + registro + montar_comandos_servico(slot, pon_card, pon_port, onu_id, onu) + ["exit"]
+
+def montar_comandos_servico(slot, pon_card, pon_port, ultimo_onu_numero, onu):
+    return perfis.obter(onu.get('perfil')).servico(f"{slot}/{pon_card}/{pon_port}", ultimo_onu_numero, onu['name'])
+
+def resposta_falha(erro, texto=None):
+    # Resposta de ONU que falhou, com o tipo da falha (timeout, serial_duplicado, circuito_aberto...)
+    return {"message": f"{texto}: {erro}" if texto else str(erro), "tipo": falhas.tipo(erro)}, 500
+
+def passos_autorizacao(pon, onus, diario_execucao=None, olt=None):
+    # Todas as ONUs de uma mesma gpon_olt num script só: um "configure terminal", um bloco
+    # "interface gpon_olt" com todos os "onu N type ... sn ...", depois os blocos de serviço de cada ONU.
+    # O registro vai primeiro e separado, pra nunca configurar serviço num ID que não ficou com a ONU.
+    # Gerador sem I/O: cada `yield (etapa, comandos, pipeline)` pede pra quem conduz rodar um script
+    # na OLT e devolver as saídas (ou jogar a exceção de volta); `yield ("espera", segundos, None)`
+    # pede uma pausa. Quem conduz é o conduzir_async; sem I/O, o passo a passo também roda em teste
+    # com saídas montadas à mão.
+    # ONU que já chega com 'onu_id' (reservado no planejamento) usa esse ID na primeira rodada; com
+    # 'registrada' (retomada de uma execução que registrou e não terminou) vai direto pro serviço.
+    # Retorna uma lista de (resposta, status_code) na mesma ordem de `onus`.
+    erro_pon = planejamento.validar_pon(pon)
+    if erro_pon is not None:
+        logging.error(f"{erro_pon} PON {pon}.")
+        return [({"message": erro_pon}, 400) for onu in onus]
+
+    slot, pon_card, pon_port = pon.split('/')
+    dispositivo = inventario.obter(olt)
+    alocador_ids = dispositivo.alocador
+    resultados = [None] * len(onus)
+    registradas = [i for i, onu in enumerate(onus) if onu.get('registrada')]
+    ids = {i: onus[i]['onu_id'] for i in registradas}
+    pendentes = [i for i in range(len(onus)) if i not in ids]
+    planejados = {i: onu['onu_id'] for i, onu in enumerate(onus) if onu.get('onu_id') is not None and i not in ids}
+
+    # Rodadas extras de registro só pras ONUs com ID já ocupado na OLT ou com falha transitória
+    for rodada in range(RODADAS_REGISTRO):
+        ultima = rodada == RODADAS_REGISTRO - 1
+        if not alocador_ids.carregada(pon):
+            # IDs em uso na PON: lidos da OLT só na primeira vez, depois a alocação é local
+            try:
+                saidas = yield "consulta_ids", alocador_ids.comandos(pon), False
+                alocador_ids.carregar(pon, saidas[1])
+            except Exception as e:
+                logging.error(f"Erro ao listar as ONUs da PON {pon}: {e}")
+                for i in pendentes:
+                    resultados[i] = resposta_falha(e, f"Erro ao listar as ONUs da PON {pon}")
+                break
+        for i in pendentes:
+            ids[i] = planejados.pop(i) if i in planejados else alocador_ids.reservar(pon)
+            if ids[i] is None:
+                logging.error(f"Nenhum ID de ONU livre na PON {pon}")
+                resultados[i] = ({"message": f"Sem ID de ONU disponível na PON {pon}.", "tipo": "sem_id"}, 500)
+        registrar = [i for i in pendentes if ids[i] is not None]
+        if not registrar:
+            break
+        if diario_execucao is not None:
+            for i in registrar:
+                diario_execucao.registrar(onus[i]['serial'], diario.ID_RESERVADO, olt=dispositivo.nome, pon=pon, onu_id=ids[i])
+
+        comandos = ["configure terminal", f"interface gpon_olt-{pon}"]
+        comandos += [comando_registro(ids[i], onus[i]) for i in registrar]
+        comandos += ["exit", "exit"]
+        try:
+            saidas = yield "registro", comandos, True
+        except Exception as e:
+            saidas = None
+            erro_envio = e
+        if saidas is None:
+            logging.error(f"Erro no registro das ONUs da PON {pon}: {erro_envio}")
+            if not falhas.classificar(erro_envio).transitorio or ultima:
+                for i in registrar:
+                    alocador_ids.liberar(pon, ids[i])
+                    resultados[i] = resposta_falha(erro_envio, "Erro na autorização da ONU")
+                break
+            # O script pode ter chegado pela metade: quem está com o ID na releitura foi registrado,
+            # o resto volta pra próxima rodada
+            try:
+                estado = yield "consulta_ids", alocador_ids.comandos(pon), False
+            except Exception as e:
+                logging.error(f"Erro ao listar as ONUs da PON {pon}: {e}")
+                for i in registrar:
+                    resultados[i] = resposta_falha(e, "Erro na autorização da ONU")
+                break
+            pendentes = []
+            for i in registrar:
+                (registradas if alocador_ids.conflito(pon, ids[i], estado[1]) else pendentes).append(i)
+            if pendentes:
+                yield "espera", dispositivo.politica.espera(rodada), None
+            continue
+
+        recusadas = []
+        for posicao, i in enumerate(registrar, start=2):
+            erros = parsers.parse_erros(saidas[posicao])
+            if erros:
+                recusadas.append((posicao, i, falhas.classificar_cli(erros[0], comandos[posicao])))
+            else:
+                registradas.append(i)
+        if not recusadas:
+            break
+
+        # Registro recusado: uma releitura da PON serve pra saber quais IDs já estavam ocupados por outra ONU
+        try:
+            estado = yield "consulta_ids", alocador_ids.comandos(pon), False
+        except Exception as e:
+            logging.error(f"Erro ao listar as ONUs da PON {pon}: {e}")
+            estado = None
+        pendentes = []
+        esperar = False
+        for posicao, i, erro in recusadas:
+            ocupado = estado is not None and alocador_ids.conflito(pon, ids[i], estado[1])
+            # SN duplicado não muda trocando de ID; OLT ocupada passa esperando um pouco
+            if not ultima and not isinstance(erro, falhas.SerialDuplicado) and (ocupado or erro.transitorio):
+                pendentes.append(i)
+                esperar = esperar or erro.transitorio
+            else:
+                logging.error(f"Erro no registro da ONU {onus[i]['serial']} ({erro.tipo}): {erro}")
+                resultados[i] = resposta_falha(erro, "Erro na autorização da ONU")
+        if not pendentes:
+            break
+        if esperar:
+            yield "espera", dispositivo.politica.espera(rodada), None
+
+    if registradas:
+        # Cada linha do script sabe de qual ONU ela é, pra jogar o erro na ONU certa
+        comandos = ["configure terminal"]
+        donos = [None]
+        for i in sorted(registradas):
+            bloco = montar_comandos_servico(slot, pon_card, pon_port, ids[i], onus[i])
+            comandos += bloco
+            donos += [i] * len(bloco)
+        comandos.append("exit")
+        donos.append(None)
+
+        try:
+            saidas = yield "servico", comandos, True
+        except Exception as e:
+            logging.error(f"Erro na configuração de serviço da PON {pon}: {e}")
+            saidas = []
+            for i in registradas:
+                resultados[i] = resposta_falha(e, "Erro na autorização da ONU")
+
+        for comando, saida, i in zip(comandos, saidas, donos):
+            if i is None or resultados[i] is not None:
+                continue
+            erros = parsers.parse_erros(saida)
+            if erros:
+                erro = falhas.classificar_cli(erros[0], comando)
+                logging.error(f"Erro na configuração da ONU {onus[i]['serial']} ({erro.tipo}): {erro}")
+                resultados[i] = resposta_falha(erro, "Erro na autorização da ONU")
+
+        # Registro passou, então o ID ficou ocupado mesmo se algum passo de serviço falhou
+        for i in registradas:
+            alocador_ids.confirmar(pon, ids[i])
+            onus[i]['onu_id'] = ids[i]
+            if resultados[i] is None:
+                resultados[i] = ({"message": f"ONU {onus[i]['serial']} autorizada com sucesso!"}, 200)
+
+    return resultados
+
+async def conduzir_async(passos, olt=None, pon=None):
+    # Roda um gerador de passos (passos_autorizacao, verificacao.passos_verificacao) nas sessões da OLT
+    rotulos = {"olt": inventario.obter(olt).nome, "pon": pon}
+    saidas, erro = None, None
+    while True:
+        try:
+            etapa, comandos, pipeline = passos.throw(erro) if erro is not None else passos.send(saidas)
+        except StopIteration as fim:
+            return fim.value
+        saidas, erro = None, None
+        if etapa == "espera":
+            await asyncio.sleep(comandos)
+            continue
+        try:
+            with metricas.etapa(etapa, **rotulos):
+                saidas = await executar_comandos_async(comandos, pipeline=pipeline, olt=olt,
+                                                       idempotente=etapa not in ETAPAS_NAO_IDEMPOTENTES)
+        except Exception as e:
+            erro = e
+
+async def autorizar_lote_pon_async(pon, onus, diario_execucao=None, olt=None):
+    return await conduzir_async(passos_autorizacao(pon, onus, diario_execucao, olt), olt=olt, pon=pon)
+
+async def verificar_pon_async(pon, onus, olt=None):
+    # ONUs já autorizadas na PON (com 'onu_id'): um "show gpon onu state" confere todas de uma vez,
+    # repetido até ficarem working. Retorna (motivo, tipo) por ONU, None pras que estão no ar.
+    return await conduzir_async(verificacao.passos_verificacao(pon, onus), olt=olt, pon=pon)
+
+def processar_planilha(arquivo_excel, max_sessoes=None, lote=None, formato=None, progresso=None, retomar=None,
+                       simular=False):
+    # Versão bloqueante pra quem não tem loop asyncio (web.py, linha de comando): roda o motor
+    # assíncrono num loop próprio até o fim. Dentro de um loop, use processar_planilha_async.
+    return asyncio.run(processar_planilha_async(
+        arquivo_excel, max_sessoes=max_sessoes, lote=lote, formato=formato, progresso=progresso, retomar=retomar,
+        simular=simular))
+
+async def processar_planilha_async(arquivo_excel, max_sessoes=None, lote=None, formato=None, progresso=None,
+                                   retomar=None, simular=False):
+    # arquivo_excel pode ser o caminho ou os bytes do arquivo (XLSX, CSV ou JSONL); as linhas são lidas sob demanda.
+    # `progresso` (progresso.Progresso) recebe as contagens em tempo real pra quem estiver acompanhando.
+    # `retomar` liga o diário da execução: True usa um diário por conteúdo de planilha, ou passe o caminho do .jsonl.
+    # Antes de registrar qualquer ONU a planilha inteira é planejada (serial -> PON -> ID -> script), com só
+    # leituras na OLT; com `simular` a execução para aí e devolve o plano.
+    # Uma migração por vez no processo: a segunda espera a primeira terminar (sem prender o loop dela).
+    if not _migracao.acquire(blocking=False):
+        logging.info("Outra migração está rodando neste processo; esperando ela terminar")
+        while not _migracao.acquire(blocking=False):
+            await asyncio.sleep(ESPERA_MIGRACAO)
     try:
-        df = pd.read_excel(arquivo_excel)
+        return await _processar_planilha_async(arquivo_excel, max_sessoes, lote, formato, progresso, retomar, simular)
+    finally:
+        _migracao.release()
+
+async def _processar_planilha_async(arquivo_excel, max_sessoes, lote, formato, progresso, retomar, simular):
+    planilha = None
+    diario_execucao = None
+    registro_cli = None
+    olts = {}
+    progresso = progresso or Progresso()
+    # Relatório de tempos só desta execução; o acumulado do processo segue no /metrics
+    metricas.execucao.zerar()
+    try:
+        # Transcrição completa da conversa com a OLT num arquivo por execução, com teto de tamanho
+        registro_cli = transcricao.Transcricao(
+            os.getenv("OLT_TRANSCRICAO_DIR", "transcricoes"),
+            max_bytes=int(float(os.getenv("OLT_TRANSCRICAO_MAX_MB", "50")) * 1024 * 1024),
+        )
+        planilha = leitor.LeitorPlanilha(arquivo_excel, formato=formato)
+        olts = inventario.carregar()
+        perfis.carregar()
         
-        if 'Serial' not in df.columns or 'Name' not in df.columns:
+        if 'Serial' not in planilha.colunas or 'Name' not in planilha.colunas:
             logging.error("A planilha não contém as colunas 'Serial' e 'Name' necessárias.")
             return {"error": "Colunas obrigatórias não encontradas na planilha."}
+        # Coluna opcional com o nome da OLT no inventário; sem ela tudo vai pra OLT padrão
+        coluna_olt = next((c for c in planilha.colunas if str(c).strip().lower() == 'olt'), None)
+        # Coluna opcional com o perfil de serviço (perfis.json) de cada ONU; sem ela vale o perfil padrão
+        coluna_perfil = next((c for c in planilha.colunas if str(c).strip().lower() == 'perfil'), None)
+
+        # PONs diferentes não dividem estado: cada PON vira uma fila, e cada OLT roda até o seu
+        # max_sessoes filas juntas (o parâmetro, se vier, vale pra todas as OLTs)
+        sessoes_por_olt = {nome: max_sessoes or olt.max_sessoes for nome, olt in olts.items()}
+        for nome, olt in olts.items():
+            olt.invalidar()
+            olt.iniciar_async(sessoes_por_olt[nome])
+        # Quantas ONUs da mesma PON vão num único script de autorização (1 = uma ONU por vez)
+        lote = lote or int(os.getenv("OLT_LOTE", "16"))
+
+        if retomar:
+            caminho = retomar if isinstance(retomar, str) else diario.caminho_para(
+                arquivo_excel, os.getenv("OLT_DIARIO_DIR", "diarios"))
+            diario_execucao = diario.Diario(caminho)
 
-        total_onus = len(df)
+        total_estimado = planilha.total_estimado or "?"
+        progresso.iniciar(planilha.total_estimado)
         processadas = 0
-        sucessos = 0
-        falhas = 0
-        sucessos_list = []
-        falhas_list = []
-
-        for index, row in df.iterrows():
-            serial = row['Serial']
-            name = row['Name']
-            
-            logging.info(f"Processando ONU {processadas + 1}/{total_onus}: Serial={serial}, Name={name}")
-            
-            if pd.notna(serial) and pd.notna(name):
-                pon = buscar_pon_olt(serial)
-                if pon:
-                    onu = {'serial': serial, 'name': name, 'pon': pon}
-                    resposta, status_code = autorizar_onu(onu)
-                    if status_code == 200:
-                        sucessos += 1
-                        sucessos_list.append(onu)
-                    else:
-                        falhas += 1
-                        falhas_list.append(onu)
-                    logging.info(f"Resultado: {resposta}")
-                else:
-                    logging.warning(f"PON não encontrada para o serial {serial}")
-                    falhas += 1
-                    falhas_list.append({'serial': serial, 'name': name})
+        resultados = {}
+        onus_por_olt = {}
+
+        def registrar(index, ok, onu, motivo=None, tipo=None):
+            resultados[index] = (ok, onu)
+            progresso.registrar(ok)
+            # Uma linha por ONU no log principal; o que a OLT respondeu fica na transcrição
+            resumo = (f"ONU {onu['serial']} (OLT {onu.get('olt') or '-'}, PON {onu.get('pon') or '-'}, "
+                      f"ID {onu.get('onu_id') or '-'})")
+            if ok:
+                logging.info(f"{resumo}: autorizada")
             else:
-                logging.warning(f"Dados inválidos na linha {index + 2}: Serial={serial}, Name={name}")
-                falhas += 1
-                falhas_list.append({'serial': serial, 'name': name})
+                onu['motivo'] = motivo
+                onu['tipo_erro'] = tipo
+                logging.warning(f"{resumo}: {motivo}")
+            if diario_execucao is not None and onu['serial'] is not None and not simular:
+                estado = diario.AUTORIZADA if ok else diario.FALHA
+                diario_execucao.registrar(onu['serial'], estado, olt=onu.get('olt'), pon=onu.get('pon'), motivo=motivo)
+
+        # Planejamento, parte 1: uma passada pelas linhas, sem escrever nada na OLT. Formato, repetidos
+        # e OLT da linha são conferidos em memória; uncfg e nomes em uso são lidos uma vez por OLT.
+        validador = planejamento.Validador()
+        nomes_por_olt = {}
+        for index, row in planilha:
+            serial = row.get('Serial')
+            name = row.get('Name')
+            nome_olt = row.get(coluna_olt) if coluna_olt else None
+            nome_perfil = row.get(coluna_perfil) if coluna_perfil else None
             
+            logging.debug(f"Planejando ONU {processadas + 1}/{total_estimado}: Serial={serial}, Name={name}")
             processadas += 1
 
-        logging.info(f"Processamento concluído. Total: {total_onus}, Sucessos: {sucessos}, Falhas: {falhas}")
+            if serial is None or name is None:
+                registrar(index, False, {'serial': serial, 'name': name}, motivo=f"Dados inválidos na linha {index}")
+                continue
+            serial = planejamento.normalizar_serial(serial)
+            name = planejamento.normalizar_nome(name)
+
+            anterior = diario_execucao.consultar(serial) if diario_execucao is not None else None
+            if anterior is not None and anterior['estado'] == diario.AUTORIZADA:
+                # Já autorizada numa execução anterior: nada de OLT pra essa linha
+                logging.info(f"ONU {serial} já autorizada numa execução anterior (PON {anterior.get('pon')}), pulando")
+                resultados[index] = (True, {'serial': serial, 'name': name, 'olt': anterior.get('olt'),
+                                            'pon': anterior.get('pon')})
+                progresso.registrar(True)
+                continue
+            if anterior is not None and anterior['estado'] == diario.ID_RESERVADO:
+                logging.warning(f"Execução anterior parou no meio da autorização da ONU {serial} "
+                                f"(PON {anterior.get('pon')}, ID {anterior.get('onu_id')}), tentando de novo")
+
+            onu = {'serial': serial, 'name': name, 'olt': None}
+            try:
+                # OLT e perfil da linha precisam estar no inventário e no perfis.json
+                onu['olt'] = olt = inventario.obter(nome_olt).nome
+                onu['perfil'] = perfis.obter(
+                    planejamento.normalizar_nome(nome_perfil) if nome_perfil is not None else None).nome
+            except ValueError as e:
+                registrar(index, False, onu, motivo=str(e))
+                continue
+            motivo = validador.validar(index, serial, name, olt)
+            if motivo is None and olt not in nomes_por_olt:
+                try:
+                    nomes_por_olt[olt] = await fotografar_olt_async(olt)
+                except Exception as e:
+                    logging.error(f"Erro ao consultar a OLT {olt} no planejamento: {e}")
+                    nomes_por_olt[olt] = e
+            tipo = None
+            if motivo is None and isinstance(nomes_por_olt[olt], Exception):
+                motivo = f"Erro ao consultar a OLT {olt}: {nomes_por_olt[olt]}"
+                tipo = falhas.tipo(nomes_por_olt[olt])
+            if (motivo is None and anterior is not None and anterior.get('onu_id') is not None
+                    and anterior.get('pon') and anterior.get('olt', olt) == olt
+                    and inventario.obter(olt).cache_uncfg.consultar(serial) is None):
+                # Execução anterior reservou um ID e o serial já saiu do uncfg: o registro passou (caiu
+                # depois dele, ou falhou no serviço/verificação). A parte 2 confere o ID na PON e a
+                # execução só refaz serviço e verificação; o nome na OLT pode ser o dela mesma.
+                logging.info(f"ONU {serial} já registrada na PON {anterior['pon']}, ID {anterior['onu_id']}, "
+                             f"retomando do serviço")
+                onu.update(pon=anterior['pon'], onu_id=anterior['onu_id'], registrada=True)
+            if motivo is None and not onu.get('registrada') and name in nomes_por_olt[olt]:
+                motivo = f"Nome {name} já existe na OLT {olt}"
+            if motivo is None and not onu.get('registrada'):
+                # Só o retrato do uncfg lido acima: serial que não está nele não chega a ir pra OLT
+                onu['pon'] = inventario.obter(olt).cache_uncfg.consultar(serial)
+                motivo = "PON não encontrada" if not onu['pon'] else planejamento.validar_pon(onu['pon'])
+            if motivo is not None:
+                registrar(index, False, onu, motivo=motivo, tipo=tipo)
+                continue
+            onus_por_olt.setdefault(olt, {}).setdefault(onu['pon'], []).append((index, onu))
+            if diario_execucao is not None and not simular:
+                diario_execucao.registrar(serial, diario.DESCOBERTA, olt=olt, pon=onu['pon'])
+
+        total_onus = processadas
+
+        # Planejamento, parte 2: um "show gpon onu state" por PON e um ID reservado pra cada ONU
+        async def planejar_pon(onus, limite):
+            async with limite:
+                primeira = onus[0][1]
+                motivos = await planejar_ids_async(primeira['pon'], [onu for index, onu in onus], olt=primeira['olt'])
+            prontas = []
+            for (index, onu), motivo in zip(onus, motivos):
+                if motivo is None:
+                    prontas.append((index, onu))
+                else:
+                    registrar(index, False, onu, motivo=motivo)
+            onus[:] = prontas
+
+        limites = {olt: asyncio.Semaphore(sessoes_por_olt[olt]) for olt in onus_por_olt}
+        await asyncio.gather(*[planejar_pon(onus, limites[olt])
+                               for olt, filas in onus_por_olt.items() for onus in filas.values()])
+
+        planejadas = sum(len(onus) for filas in onus_por_olt.values() for onus in filas.values())
+        logging.info(f"Plano: {planejadas} ONUs prontas pra autorizar, {len(resultados)} fora do plano")
+        if simular:
+            plano = sorted(
+                (dict(onu, linha=index, comandos=montar_script_onu(onu['pon'], onu['onu_id'], onu))
+                 for filas in onus_por_olt.values() for onus in filas.values() for index, onu in onus),
+                key=lambda item: (item['olt'], item['pon'], item['linha']),
+            )
+            falhas_list = [onu for index, (ok, onu) in sorted(resultados.items()) if not ok]
+            return {
+                "simulacao": True,
+                "total": total_onus,
+                "planejadas": planejadas,
+                "falhas": len(falhas_list),
+                "plano": plano,
+                "script": planejamento.texto_plano(plano),
+                "falhas_list": falhas_list,
+                "metricas": metricas.execucao.resumo(),
+                "transcricao": registro_cli.caminho,
+            }
+
+        verificar = verificacao.ligada()
+
+        async def migrar_pon(onus, limite):
+            # Dentro da PON é sequencial, então a alocação de IDs nunca concorre consigo mesma;
+            # `limite` segura quantas PONs da mesma OLT rodam juntas (o max_sessoes dela)
+            # Com a verificação ligada, quem foi autorizado só conta como sucesso depois de aparecer working
+            autorizadas = []
+
+            def concluir(index, onu, resposta, status_code):
+                if status_code != 200:
+                    registrar(index, False, onu, motivo=resposta['message'], tipo=resposta.get('tipo'))
+                elif verificar:
+                    autorizadas.append((index, onu))
+                else:
+                    registrar(index, True, onu)
+
+            async with limite:
+                if lote > 1:
+                    for inicio in range(0, len(onus), lote):
+                        parte = onus[inicio:inicio + lote]
+                        progresso.atual(parte[0][1]['serial'])
+                        primeira = parte[0][1]
+                        respostas = await autorizar_lote_pon_async(
+                            primeira['pon'], [onu for index, onu in parte], diario_execucao, olt=primeira['olt'])
+                        for (index, onu), (resposta, status_code) in zip(parte, respostas):
+                            concluir(index, onu, resposta, status_code)
+                else:
+                    for index, onu in onus:
+                        progresso.atual(onu['serial'])
+                        resposta, status_code = await autorizar_onu_async(onu, diario_execucao)
+                        concluir(index, onu, resposta, status_code)
+
+            # Fora do `limite`: a espera entre uma leitura e outra não segura a vez das outras PONs
+            if autorizadas:
+                primeira = autorizadas[0][1]
+                conferidas = await verificar_pon_async(primeira['pon'], [onu for index, onu in autorizadas],
+                                                       olt=primeira['olt'])
+                for (index, onu), conferida in zip(autorizadas, conferidas):
+                    if conferida is None:
+                        registrar(index, True, onu)
+                    else:
+                        registrar(index, False, onu, motivo=conferida[0], tipo=conferida[1])
+
+        # Execução: só o que entrou no plano. Uma tarefa por PON num loop só; OLTs diferentes
+        # não dividem nada e andam ao mesmo tempo
+        await asyncio.gather(*[migrar_pon(onus, limites[olt])
+                               for olt, filas in onus_por_olt.items() for onus in filas.values() if onus])
+
+        # Mesma ordem da planilha, independente de qual PON terminou primeiro
+        sucessos_list = [onu for index, (ok, onu) in sorted(resultados.items()) if ok]
+        falhas_list = [onu for index, (ok, onu) in sorted(resultados.items()) if not ok]
+        # n_falhas, não `falhas`: o nome é do módulo, usado no planejamento desta mesma função
+        n_sucessos = len(sucessos_list)
+        n_falhas = len(falhas_list)
+
+        logging.info(f"Processamento concluído. Total: {total_onus}, Sucessos: {n_sucessos}, Falhas: {n_falhas}")
         return {
             "total": total_onus,
-            "sucessos": sucessos,
-            "falhas": falhas,
+            "sucessos": n_sucessos,
+            "falhas": n_falhas,
             "sucessos_list": sucessos_list,
-            "falhas_list": falhas_list
+            "falhas_list": falhas_list,
+            "metricas": metricas.execucao.resumo(),
+            "transcricao": registro_cli.caminho,
         }
 
     except Exception as e:
         logging.error(f"Erro ao processar a planilha: {e}")
-        return {"error": str(e)}
+        return {"error": str(e), "transcricao": registro_cli.caminho if registro_cli is not None else None}
+    finally:
+        progresso.finalizar()
+        if registro_cli is not None:
+            registro_cli.fechar()
+        if diario_execucao is not None:
+            diario_execucao.fechar()
+        if planilha is not None:
+            planilha.fechar()
+        # As sessões ficam abertas durante a planilha inteira e só fecham no fim da execução
+        for olt in olts.values():
+            olt.fechar_async()
+        inventario.fechar_todas()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     arquivo_excel = "planilha_onus.xlsx"
-    resultado = processar_planilha(arquivo_excel)
-    print(resultado)
\ No newline at end of file
+    resultado = processar_planilha(arquivo_excel, retomar=True)
+    print(resultado)
@@ -0,0 +1,149 @@
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import zip_longest
+
+import openpyxl
+
+# raiz do projeto no PATH para importar os módulos do app
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import app
+import inventario
+from fake_olt import gerar_pons, gerar_seriais
+
+ONUS_POR_PON = 100
+
+
+def gerar_planilha(linhas):
+    # linhas: (serial, olt); a coluna OLT só entra quando tem mais de uma OLT
+    com_olt = len({olt for serial, olt in linhas}) > 1
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Serial", "Name", "OLT"] if com_olt else ["Serial", "Name"])
+    for i, (serial, olt) in enumerate(linhas):
+        sheet.append([serial, f"cliente{i}", olt] if com_olt else [serial, f"cliente{i}"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def subir_olt(quantidade, pons, latencia, semente, queda=0.0, ocupada=0.0):
+    # OLT fake em outro processo, pra não disputar o GIL com a migração que está sendo medida
+    processo = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), "fake_olt.py"), "--porta", "0",
+         "--onus", str(quantidade), "--pons", str(pons), "--latencia", str(latencia), "--semente", str(semente),
+         "--queda", str(queda), "--ocupada", str(ocupada)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    linha = processo.stdout.readline()
+    if not linha.startswith("porta="):
+        processo.kill()
+        raise RuntimeError("OLT fake não subiu")
+    return processo, int(linha.split("=")[1])
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def medir_latencias(latencias):
+    # Cronometra cada chamada de autorização; num lote, todas as ONUs dele esperam o lote inteiro
+    original = app.autorizar_lote_pon_async
+
+    async def autorizar_medindo(pon, onus, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return await original(pon, onus, *args, **kwargs)
+        finally:
+            latencias.extend([time.perf_counter() - inicio] * len(onus))
+
+    app.autorizar_lote_pon_async = autorizar_medindo
+    return original
+
+
+def rodar(quantidade, args):
+    # As linhas são divididas entre as OLTs fake, cada uma com seus seriais e seu teto de sessões
+    processos = []
+    olts = {}
+    linhas = []
+    total_pons = 0
+    try:
+        for k in range(args.olts):
+            parte = quantidade // args.olts + (1 if k < quantidade % args.olts else 0)
+            pons = gerar_pons(max(1, math.ceil(parte / ONUS_POR_PON)))
+            total_pons += len(pons)
+            seriais = gerar_seriais(parte, pons, args.semente + k)
+            processo, porta = subir_olt(parte, len(pons), args.latencia, args.semente + k, args.queda, args.ocupada)
+            processos.append(processo)
+            nome = f"olt{k + 1}"
+            olts[nome] = {"host": "127.0.0.1", "port": porta, "username": "admin", "password": "admin",
+                          "max_sessoes": args.sessoes}
+            linhas.append([(serial, nome) for serial in seriais])
+        # Intercala as OLTs na planilha, como uma planilha de várias sites misturados
+        linhas = [linha for grupo in zip_longest(*linhas) for linha in grupo if linha is not None]
+        planilha = gerar_planilha(linhas)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as arquivo:
+            json.dump({"olts": olts}, arquivo)
+        os.environ["OLT_INVENTARIO"] = arquivo.name
+        latencias = []
+        original = medir_latencias(latencias)
+        try:
+            inicio = time.perf_counter()
+            resultado = app.processar_planilha(planilha, lote=args.lote, formato="xlsx")
+            decorrido = time.perf_counter() - inicio
+            sessoes = sum(olt.pool_async.handshakes for olt in inventario.todas())
+        finally:
+            app.autorizar_lote_pon_async = original
+            os.unlink(arquivo.name)
+    finally:
+        for processo in processos:
+            processo.kill()
+            processo.wait()
+
+    if "error" in resultado:
+        raise RuntimeError(resultado["error"])
+    print(f"{quantidade:>7} {args.olts:>4} {total_pons:>5} {quantidade / decorrido:>10.1f} "
+          f"{percentil(latencias, 50) * 1000:>9.1f} {percentil(latencias, 99) * 1000:>9.1f} {sessoes:>8} "
+          f"{resultado['sucessos']:>8} {resultado['falhas']:>6} {decorrido:>8.1f}")
+    if args.metricas:
+        for linha in resultado["metricas"]["etapas"]:
+            print(f"    {linha['etapa']:<18} {linha['chamadas']:>6}x  total {linha['total_s']:>7.2f}s  "
+                  f"média {linha['media_ms']:>7.1f}ms  p95 ≤{linha['p95_ms']:>7.1f}ms  {linha['bytes']:>10} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a migração de ponta a ponta contra a OLT fake")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--sessoes", type=int, default=4, help="max_sessoes de cada OLT")
+    parser.add_argument("--olts", type=int, default=1, help="quantas OLTs fake dividem as linhas")
+    parser.add_argument("--lote", type=int, default=16, help="OLT_LOTE")
+    parser.add_argument("--latencia", type=float, default=0.0, help="latência da OLT fake por comando (s)")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--queda", type=float, default=0.0, help="chance da OLT fake derrubar o canal por comando")
+    parser.add_argument("--ocupada", type=float, default=0.0, help="chance da OLT fake recusar um registro com 'busy'")
+    parser.add_argument("--metricas", action="store_true", help="mostra o tempo gasto em cada etapa")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    print(f"olts={args.olts} sessões por OLT={args.sessoes} lote={args.lote} latência={args.latencia}s")
+    print(f"{'linhas':>7} {'OLTs':>4} {'PONs':>5} {'ONUs/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'sessões':>8} "
+          f"{'sucessos':>8} {'falhas':>6} {'tempo (s)':>8}")
+    for quantidade in args.tamanhos:
+        rodar(quantidade, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# raiz do projeto no PATH para importar os módulos do app
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import parsers
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus")
+ESPERADO = os.path.join(CORPUS, "esperado.json")
+
+# Qual parser roda em cada arquivo do corpus
+PARSER_POR_ARQUIVO = {
+    "uncfg_c600.txt": parsers.parse_uncfg,
+    "uncfg_c300.txt": parsers.parse_uncfg,
+    "onu_state_c600.txt": parsers.parse_estado_onus,
+    "onu_state_vazio.txt": parsers.parse_estado_onus,
+    "erros.txt": parsers.parse_erros,
+    # conjunto de nomes, em ordem pra comparar com o golden
+    "running_config_nomes.txt": lambda saida: sorted((nome,) for nome in parsers.parse_nomes(saida)),
+    "onu_detail_info.txt": lambda saida: [(parsers.parse_serial_detalhe(saida),)],
+}
+
+
+def ler(nome):
+    with open(os.path.join(CORPUS, nome), encoding="utf-8") as arquivo:
+        return arquivo.read()
+
+
+def conferir_corpus(atualizar=False):
+    # Arquivos gravados da CLI -> registros esperados (golden files)
+    obtido = {nome: [list(r) for r in parser(ler(nome))] for nome, parser in PARSER_POR_ARQUIVO.items()}
+    if atualizar:
+        with open(ESPERADO, "w", encoding="utf-8") as arquivo:
+            json.dump(obtido, arquivo, indent=2, ensure_ascii=False)
+            arquivo.write("\n")
+        print(f"{ESPERADO} atualizado")
+        return True
+
+    with open(ESPERADO, encoding="utf-8") as arquivo:
+        esperado = json.load(arquivo)
+    ok = True
+    for nome in PARSER_POR_ARQUIVO:
+        if obtido[nome] != esperado.get(nome):
+            ok = False
+            print(f"DIVERGENTE {nome}\n  esperado: {esperado.get(nome)}\n  obtido:   {obtido[nome]}")
+    print(f"corpus: {len(PARSER_POR_ARQUIVO)} arquivos, {'ok' if ok else 'com divergências'}")
+    return ok
+
+
+def gerar_estado_pon(pon, quantidade=128):
+    fases = ["working"] * 8 + ["LOS", "DyingGasp", "OffLine"]
+    linhas = [
+        "OnuIndex        Admin State  OMCC State  Phase State  Channel",
+        "-" * 62,
+    ]
+    for onu_id in range(1, quantidade + 1):
+        linhas.append(f"{pon + ':' + str(onu_id):<16}enable       enable      {random.choice(fases):<13}1(GPON)")
+    linhas.append(f"ONU Number: {quantidade}/{quantidade}")
+    return "\n".join(linhas)
+
+
+def gerar_uncfg(pons, por_pon):
+    linhas = [
+        "OltIndex            Model                SN                PW",
+        "-" * 67,
+    ]
+    for pon in pons:
+        for _ in range(por_pon):
+            linhas.append(f"gpon_olt-{pon:<14}F670LV9.0            ZTEG{random.getrandbits(32):08X}      N/A")
+    return "\n".join(linhas)
+
+
+def medir(nome, parser, textos, repeticoes):
+    tamanho = sum(len(t) for t in textos)
+    linhas = sum(t.count("\n") + 1 for t in textos)
+    registros = sum(len(parser(t)) for t in textos)
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for texto in textos:
+            parser(texto)
+    decorrido = time.perf_counter() - inicio
+    print(f"{nome:<28} {repeticoes * tamanho / decorrido / 1e6:8.1f} MB/s "
+          f"{repeticoes * linhas / decorrido:12,.0f} linhas/s {repeticoes * registros / decorrido:12,.0f} registros/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confere o corpus da CLI ZTE e mede a vazão dos parsers")
+    parser.add_argument("--atualizar", action="store_true", help="regrava corpus/esperado.json com a saída atual")
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--cartoes", type=int, default=4)
+    parser.add_argument("--portas", type=int, default=16)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    if not conferir_corpus(args.atualizar):
+        sys.exit(1)
+
+    random.seed(0)
+    pons = [f"{s}/{c}/{p}" for s in range(1, args.slots + 1)
+            for c in range(1, args.cartoes + 1) for p in range(1, args.portas + 1)]
+    estados = [gerar_estado_pon(pon) for pon in pons]
+    uncfg = [gerar_uncfg(pons, 8)]
+    print(f"{len(pons)} PONs com 128 ONUs cada, uncfg com {len(pons) * 8} ONUs")
+    medir("show gpon onu state", parsers.parse_estado_onus, estados, args.repeticoes)
+    medir("show pon onu uncfg", parsers.parse_uncfg, uncfg, args.repeticoes)
+    medir("erros (sobre os dumps)", parsers.parse_erros, estados, args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+import argparse
+import logging
+import random
+import re
+import socket
+import sys
+import threading
+import time
+
+import paramiko
+
+# OLT ZTE de mentira pra testar e medir a migração sem equipamento: servidor SSH local (paramiko)
+# com modos da CLI, paginação --More--, tabelas de uncfg/state e latência configurável por comando.
+
+LINHAS_POR_PAGINA = 24
+
+
+class EstadoOLT:
+    def __init__(self, uncfg=None, onus=None, fase_nova="working"):
+        self.lock = threading.Lock()
+        self.uncfg = dict(uncfg or {})  # serial -> pon
+        self.onus = {}  # pon -> {onu_id: serial}
+        self.nomes = {}  # (pon, onu_id) -> name
+        self.seriais = set()
+        for pon, ids in (onus or {}).items():
+            self.onus[pon] = dict(ids)
+            self.seriais.update(s.upper() for s in ids.values())
+        self.fase_nova = fase_nova
+        self.handshakes = 0
+        self.comandos = 0
+
+
+class _Servidor(paramiko.ServerInterface):
+    def __init__(self, usuario, senha):
+        self.usuario = usuario
+        self.senha = senha
+        self.shell_pedido = threading.Event()
+
+    def check_auth_password(self, username, password):
+        if username == self.usuario and password == self.senha:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OPEN_REQUEST
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_pedido.set()
+        return True
+
+
+class FakeOLT:
+    # `latencia` vale pra todo comando; `latencias` sobrescreve por prefixo, ex. {"show": 0.2}.
+    # `queda` é a chance de a OLT derrubar o canal num comando; `ocupada`, a de recusar um registro
+    # com "system is busy" (as duas pra testar as novas tentativas)
+    def __init__(self, estado=None, hostname="OLT-FAKE", usuario="admin", senha="admin",
+                 latencia=0.0, latencias=None, host="127.0.0.1", porta=0, queda=0.0, ocupada=0.0, semente=None):
+        self.estado = estado or EstadoOLT()
+        self.hostname = hostname
+        self.usuario = usuario
+        self.senha = senha
+        self.latencia = latencia
+        self.latencias = latencias or {}
+        self.queda = queda
+        self.ocupada = ocupada
+        self.aleatorio = random.Random(semente)
+        self.chave = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, porta))
+        self.sock.listen(100)
+        self.host = host
+        self.porta = self.sock.getsockname()[1]
+
+    def iniciar(self):
+        threading.Thread(target=self._aceitar, name="fake-olt", daemon=True).start()
+        return self
+
+    def parar(self):
+        self.sock.close()
+
+    def atraso(self, comando):
+        for prefixo, segundos in self.latencias.items():
+            if comando.startswith(prefixo):
+                return segundos
+        return self.latencia
+
+    def _aceitar(self):
+        while True:
+            try:
+                cliente, _ = self.sock.accept()
+            except OSError:
+                return
+            cliente.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._atender, args=(cliente,), daemon=True).start()
+
+    def _atender(self, cliente):
+        transport = paramiko.Transport(cliente)
+        transport.add_server_key(self.chave)
+        servidor = _Servidor(self.usuario, self.senha)
+        try:
+            transport.start_server(server=servidor)
+            canal = transport.accept(20)
+            if canal is None or not servidor.shell_pedido.wait(10):
+                return
+            with self.estado.lock:
+                self.estado.handshakes += 1
+            _Sessao(self, canal).rodar()
+        except (EOFError, OSError, paramiko.SSHException):
+            pass
+        finally:
+            transport.close()
+
+
+class _Sessao:
+    def __init__(self, olt, canal):
+        self.olt = olt
+        self.estado = olt.estado
+        self.canal = canal
+        self.modos = []
+        self.pon = None
+        self.onu = None
+
+    def prompt(self):
+        if self.modos:
+            return f"{self.olt.hostname}({self.modos[-1]})#"
+        return f"{self.olt.hostname}#"
+
+    def rodar(self):
+        self.canal.send(f"\r\nZXA10 OLT simulada\r\n\r\n{self.prompt()}")
+        buffer = ""
+        while True:
+            dados = self.canal.recv(65536)
+            if not dados:
+                return
+            buffer += dados.decode("utf-8", errors="replace")
+            while "\n" in buffer:
+                linha, buffer = buffer.split("\n", 1)
+                comando = linha.strip()
+                self.canal.send(comando + "\r\n")
+                atraso = self.olt.atraso(comando)
+                if atraso:
+                    time.sleep(atraso)
+                if self.olt.queda and self.olt.aleatorio.random() < self.olt.queda:
+                    self.canal.close()
+                    return
+                saida = self.executar(comando)
+                if saida is None:
+                    self.canal.close()
+                    return
+                self.paginar(saida)
+                self.canal.send(self.prompt())
+
+    def paginar(self, saida):
+        linhas = saida.splitlines()
+        while len(linhas) > LINHAS_POR_PAGINA:
+            self.canal.send("\r\n".join(linhas[:LINHAS_POR_PAGINA]) + "\r\n --More--")
+            linhas = linhas[LINHAS_POR_PAGINA:]
+            while True:
+                tecla = self.canal.recv(1)
+                if not tecla:
+                    return
+                if tecla in (b" ", b"\r", b"\n"):
+                    break
+            # Apaga o --More-- como a CLI de verdade faz
+            self.canal.send("\x08" * 9 + " " * 9 + "\x08" * 9)
+        if linhas:
+            self.canal.send("\r\n".join(linhas) + "\r\n")
+
+    def executar(self, comando):
+        estado = self.estado
+        with estado.lock:
+            estado.comandos += 1
+
+        if not comando:
+            return ""
+        if comando == "exit":
+            if not self.modos:
+                return None
+            self.modos.pop()
+            return ""
+        if comando == "end":
+            self.modos = []
+            return ""
+        if comando == "configure terminal":
+            if not self.modos:
+                self.modos.append("config")
+            return ""
+        if comando == "show pon onu uncfg":
+            return self.show_uncfg()
+        if comando == "show running-config | include name":
+            return self.show_nomes()
+        m = re.match(r"show gpon onu state gpon_olt-(\d+/\d+/\d+)$", comando)
+        if m:
+            return self.show_state(m.group(1))
+        m = re.match(r"show gpon onu detail-info gpon_onu-(\d+/\d+/\d+):(\d+)$", comando)
+        if m:
+            return self.show_detalhe(m.group(1), int(m.group(2)))
+        if not self.modos:
+            return "% Invalid input detected at '^' marker."
+
+        modo = self.modos[-1]
+        m = re.match(r"interface gpon_olt-(\d+/\d+/\d+)$", comando)
+        if m and modo == "config":
+            self.pon = m.group(1)
+            self.onu = None
+            self.modos.append("config-if")
+            return ""
+        m = re.match(r"onu (\d+) type (\S+) sn (\S+)$", comando)
+        if m and modo == "config-if" and self.pon:
+            return self.registrar(int(m.group(1)), m.group(3))
+        m = re.match(r"no onu (\d+)$", comando)
+        if m and modo == "config-if" and self.pon:
+            with estado.lock:
+                serial = estado.onus.get(self.pon, {}).pop(int(m.group(1)), None)
+                if serial is not None:
+                    estado.seriais.discard(serial.upper())
+                estado.nomes.pop((self.pon, int(m.group(1))), None)
+            return ""
+        m = re.match(r"interface (gpon_onu-(\d+/\d+/\d+):(\d+)|vport-(\d+/\d+/\d+)\.(\d+):\d+)$", comando)
+        if m and modo == "config":
+            pon, onu_id = (m.group(2), m.group(3)) if m.group(2) else (m.group(4), m.group(5))
+            if not self.existe(pon, int(onu_id)):
+                return "%Error 20201: The ONU does not exist."
+            self.pon = None
+            self.onu = (pon, int(onu_id)) if m.group(2) else None
+            self.modos.append("config-if")
+            return ""
+        m = re.match(r"pon-onu-mng gpon_onu-(\d+/\d+/\d+):(\d+)$", comando)
+        if m and modo == "config":
+            if not self.existe(m.group(1), int(m.group(2))):
+                return "%Error 20201: The ONU does not exist."
+            self.modos.append("gpon-onu-mng")
+            return ""
+        m = re.match(r"name (\S+)$", comando)
+        if m and modo == "config-if" and self.onu:
+            with estado.lock:
+                estado.nomes[self.onu] = m.group(1)
+            return ""
+        if modo in ("config-if", "gpon-onu-mng"):
+            # Comandos de serviço (name, tcont, gemport, vport, service...) são aceitos sem conferir
+            return ""
+        return "% Invalid input detected at '^' marker."
+
+    def existe(self, pon, onu_id):
+        with self.estado.lock:
+            return onu_id in self.estado.onus.get(pon, {})
+
+    def registrar(self, onu_id, serial):
+        if self.olt.ocupada and self.olt.aleatorio.random() < self.olt.ocupada:
+            return "%Error 10001: The system is busy, please try again later."
+        estado = self.estado
+        with estado.lock:
+            ocupados = estado.onus.setdefault(self.pon, {})
+            if not 1 <= onu_id <= 128:
+                return "%Error 20003: Parameter out of range."
+            if onu_id in ocupados:
+                return f"%Error 20209: ONU {onu_id} already exists."
+            if serial.upper() in estado.seriais:
+                return "%Code 32310-GPONSRV : SN already exists."
+            ocupados[onu_id] = serial
+            estado.seriais.add(serial.upper())
+            estado.uncfg.pop(serial, None)
+        return ""
+
+    def show_uncfg(self):
+        with self.estado.lock:
+            itens = sorted(self.estado.uncfg.items(), key=lambda item: item[1])
+        if not itens:
+            return "%Code 70405: No related information to show."
+        linhas = ["OltIndex            Model                SN                PW", "-" * 67]
+        for serial, pon in itens:
+            linhas.append(f"gpon_olt-{pon:<14}F670LV9.0            {serial:<18}N/A")
+        return "\n".join(linhas)
+
+    def show_nomes(self):
+        with self.estado.lock:
+            nomes = [self.estado.nomes[chave] for chave in sorted(self.estado.nomes)]
+        return "\n".join([f"hostname {self.olt.hostname}"] + [f"  name {nome}" for nome in nomes])
+
+    def show_detalhe(self, pon, onu_id):
+        with self.estado.lock:
+            serial = self.estado.onus.get(pon, {}).get(onu_id)
+            nome = self.estado.nomes.get((pon, onu_id), "")
+        if serial is None:
+            return "%Code 32310: The ONU does not exist."
+        return "\n".join([
+            f"ONU interface:          gpon_onu-{pon}:{onu_id}",
+            "Type:                   F670LV9.0",
+            f"Name:                   {nome}",
+            "State:                  ready",
+            f"Serial number:          {serial}",
+            f"Phase state:            {self.estado.fase_nova}",
+        ])
+
+    def show_state(self, pon):
+        with self.estado.lock:
+            onus = sorted(self.estado.onus.get(pon, {}))
+        if not onus:
+            return "%Code 70405: No related information to show."
+        linhas = ["OnuIndex        Admin State  OMCC State  Phase State  Channel", "-" * 62]
+        for onu_id in onus:
+            linhas.append(f"{pon + ':' + str(onu_id):<16}enable       enable      {self.estado.fase_nova:<13}1(GPON)")
+        linhas.append(f"ONU Number: {len(onus)}/{len(onus)}")
+        return "\n".join(linhas)
+
+
+def gerar_seriais(quantidade, pons, semente=0):
+    # Mesma semente -> mesmos seriais, pra planilha do benchmark e OLT fake baterem
+    aleatorio = random.Random(semente)
+    return {f"ZTEG{aleatorio.getrandbits(32):08X}": pons[i % len(pons)] for i in range(quantidade)}
+
+
+def gerar_pons(quantidade):
+    return [f"1/{1 + i // 16}/{1 + i % 16}" for i in range(quantidade)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sobe uma OLT ZTE simulada via SSH")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=2222)
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--senha", default="admin")
+    parser.add_argument("--onus", type=int, default=100, help="ONUs não configuradas na lista uncfg")
+    parser.add_argument("--pons", type=int, default=4)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por comando")
+    parser.add_argument("--latencia-show", type=float, default=None, help="segundos por comando show")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--queda", type=float, default=0.0, help="chance de derrubar o canal a cada comando")
+    parser.add_argument("--ocupada", type=float, default=0.0, help="chance de recusar um registro com 'busy'")
+    args = parser.parse_args()
+
+    pons = gerar_pons(args.pons)
+    latencias = {"show": args.latencia_show} if args.latencia_show is not None else None
+    olt = FakeOLT(
+        EstadoOLT(gerar_seriais(args.onus, pons, args.semente)),
+        usuario=args.usuario,
+        senha=args.senha,
+        latencia=args.latencia,
+        latencias=latencias,
+        host=args.host,
+        porta=args.porta,
+        queda=args.queda,
+        ocupada=args.ocupada,
+        semente=args.semente,
+    ).iniciar()
+    print(f"porta={olt.porta}", flush=True)
+    logging.info(f"OLT fake ouvindo em {args.host}:{olt.porta} com {args.onus} ONUs em {args.pons} PONs")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        olt.parar()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,312 @@
+import argparse
+import codecs
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+
+import planejamento
+
+# Converte o JSON exportado pela OLT antiga na planilha da migração (Serial, Name) sem carregar o
+# export inteiro: o JSON é lido em blocos e cada registro sai direto pro XLSX (write_only) ou pro JSONL.
+
+TAMANHO_BLOCO = 1024 * 1024
+COLUNAS = ["Serial", "Name"]
+BRANCOS = " \t\r\n"
+DIGITOS = "0123456789.eE+-"
+# Item de coluna que o _itens lê sem o decoder: "texto" ou null numa lista, ou "índice": item num objeto
+ITEM_LISTA_RE = re.compile(r'[ \t\r\n]*("(?:[^"\\]|\\.)*"|null)[ \t\r\n]*,?')
+ITEM_OBJETO_RE = re.compile(r'[ \t\r\n]*"[^"\\]*"[ \t\r\n]*:[ \t\r\n]*("(?:[^"\\]|\\.)*"|null)[ \t\r\n]*,?')
+# Valor do topo maior que TAMANHO_BLOCO, que o _Texto.valor não junta inteiro
+GRANDE = object()
+
+
+def _blocos(origem):
+    # Caminho, bytes ou arquivo binário aberto (upload do Streamlit) -> pedaços de texto
+    if isinstance(origem, (bytes, bytearray)):
+        origem = io.BytesIO(origem)
+    arquivo = open(origem, "rb") if isinstance(origem, (str, os.PathLike)) else origem
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        while True:
+            dados = arquivo.read(TAMANHO_BLOCO)
+            texto = decoder.decode(dados, final=not dados)
+            if texto:
+                yield texto
+            if not dados:
+                return
+    finally:
+        if arquivo is not origem:
+            arquivo.close()
+
+
+class _Texto:
+    # Janela sobre os blocos do export: só lê mais quando o valor da vez passa do fim do que já foi lido
+    def __init__(self, origem):
+        self.blocos = _blocos(origem)
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+
+    def _ler(self, minimo=1):
+        # Junta ao que falta consumir pelo menos `minimo` caracteres novos (menos, no fim do arquivo)
+        novos, lidos = [], 0
+        while lidos < minimo:
+            bloco = next(self.blocos, None)
+            if bloco is None:
+                break
+            novos.append(bloco)
+            lidos += len(bloco)
+        if novos:
+            self.buffer = self.buffer[self.pos:] + "".join(novos)
+            self.pos = 0
+        return lidos > 0
+
+    def caractere(self):
+        # Próximo caractere fora de branco, sem consumir; None no fim do arquivo
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in BRANCOS:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._ler():
+                return None
+
+    def pular(self, esperado):
+        if self.caractere() != esperado:
+            raise json.JSONDecodeError(f"Esperava '{esperado}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def valor(self, limite=None):
+        # Um valor JSON inteiro. Valor cortado no fim do buffer: lê pelo menos mais o tanto que já está
+        # pendente antes de tentar de novo, então um valor grande custa O(n) e não O(n²) pra decodificar.
+        # Com `limite`, devolve GRANDE em vez de juntar mais que isso (quem chamou lê o valor aos pedaços).
+        self.caractere()
+        while True:
+            try:
+                valor, fim = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                pendente = len(self.buffer) - self.pos
+                if limite is not None and pendente > limite:
+                    return GRANDE
+                if not self._ler(pendente):
+                    raise
+                continue
+            # Número no fim do bloco pode continuar no próximo ("1." de um "1.5", "12" de um "123")
+            numero = isinstance(valor, (int, float)) and not isinstance(valor, bool)
+            if numero and not self.buffer[fim:].strip(DIGITOS) and self._ler():
+                continue
+            self.pos = fim
+            return valor
+
+
+def _topo(texto):
+    # Para em cada valor do topo: os itens de uma lista ("[{...}, {...}]") ou objetos em sequência (JSONL).
+    # Quem recebe o caractere consome o valor antes de pedir o próximo.
+    em_lista = texto.caractere() == "["
+    if em_lista:
+        texto.pos += 1
+    while True:
+        caractere = texto.caractere()
+        if caractere is None or (em_lista and caractere == "]"):
+            return
+        if em_lista and caractere == ",":
+            texto.pos += 1
+            continue
+        yield caractere
+
+
+def _itens(texto):
+    # Valores de uma coluna, um por vez: lista ([...]) ou objeto por índice ({"0": ..., "1": ...})
+    fim = "]" if texto.caractere() == "[" else "}"
+    item_re = ITEM_LISTA_RE if fim == "]" else ITEM_OBJETO_RE
+    texto.pos += 1
+    while True:
+        # Caminho rápido: texto ou null inteiro dentro do buffer, sem passar pelo decoder
+        m = item_re.match(texto.buffer, texto.pos)
+        if m:
+            texto.pos = m.end()
+            bruto = m.group(1)
+            if bruto == "null":
+                yield None
+            else:
+                yield json.loads(bruto) if "\\" in bruto else bruto[1:-1]
+            continue
+        caractere = texto.caractere()
+        if caractere is None:
+            raise json.JSONDecodeError("Export terminou no meio de uma coluna", texto.buffer, texto.pos)
+        if caractere in (fim, ","):
+            texto.pos += 1
+            if caractere == fim:
+                return
+            continue
+        if fim == "}":
+            texto.valor()
+            texto.pular(":")
+        yield texto.valor()
+
+
+def _objeto_grande(texto):
+    # Objeto que não cabe num bloco: em geral o export por colunas do pandas ({"serial": {"0": ...},
+    # "name": {"0": ...}}), lido membro a membro. A primeira coluna fica em memória (só os valores) e a
+    # segunda já sai casada com ela pela posição, item a item. Um registro comum que só é grande por
+    # causa de outro campo sai como registro.
+    texto.pular("{")
+    campos = {}
+    primeira = None
+    casados = 0
+    while True:
+        caractere = texto.caractere()
+        if caractere == "}":
+            texto.pos += 1
+            break
+        if caractere == ",":
+            texto.pos += 1
+            continue
+        campo = str(texto.valor()).strip().lower()
+        texto.pular(":")
+        coluna = campo in ("serial", "name") and campo not in campos and texto.caractere() in ("{", "[")
+        if not coluna:
+            campos.setdefault(campo, texto.valor())
+        elif primeira is None:
+            primeira = campo, list(_itens(texto))
+            campos[campo] = None
+        else:
+            valores = primeira[1]
+            for valor in _itens(texto):
+                outro = valores[casados] if casados < len(valores) else None
+                if campo == "serial":
+                    yield valor, outro
+                elif casados < len(valores):
+                    yield outro, valor
+                casados += 1
+            campos[campo] = None
+
+    if primeira is None:
+        yield campos.get("serial"), campos.get("name")
+    elif primeira[0] == "serial":
+        # Seriais além dos nomes (ou sem coluna de nomes)
+        for serial in primeira[1][casados:]:
+            yield serial, None
+
+
+def _campo(registro, nome):
+    for chave, valor in registro.items():
+        if str(chave).strip().lower() == nome:
+            return valor
+    return None
+
+
+def registros(origem):
+    # (serial, name) como vieram no export
+    texto = _Texto(origem)
+    for caractere in _topo(texto):
+        # Registro comum cabe num bloco; o que não cabe é lido aos pedaços
+        valor = texto.valor(limite=TAMANHO_BLOCO if caractere == "{" else None)
+        if valor is GRANDE:
+            yield from _objeto_grande(texto)
+            continue
+        if not isinstance(valor, dict):
+            continue
+        serial, name = _campo(valor, "serial"), _campo(valor, "name")
+        if isinstance(serial, (dict, list)):
+            # Export por colunas pequeno, que coube inteiro num bloco
+            seriais = list(serial.values() if isinstance(serial, dict) else serial)
+            nomes = list(name.values() if isinstance(name, dict) else (name or []))
+            yield from zip(seriais, nomes + [None] * (len(seriais) - len(nomes)))
+            continue
+        yield serial, name
+
+
+def onus(origem, contagem=None):
+    # Serial normalizado (sem espaços, maiúsculo), sem serial repetido (vale o primeiro).
+    # `contagem` (dict) recebe quantos registros foram lidos, repetidos e sem serial.
+    contagem = contagem if contagem is not None else {}
+    for chave in ("lidos", "repetidos", "sem_serial", "convertidos"):
+        contagem.setdefault(chave, 0)
+    vistos = set()
+    for serial, name in registros(origem):
+        contagem["lidos"] += 1
+        serial = None if serial is None else planejamento.normalizar_serial(serial)
+        if not serial:
+            contagem["sem_serial"] += 1
+            continue
+        if serial in vistos:
+            contagem["repetidos"] += 1
+            continue
+        vistos.add(serial)
+        contagem["convertidos"] += 1
+        yield serial, planejamento.normalizar_nome(name) if name is not None else None
+
+
+def gerar_xlsx(origem, destino=None, contagem=None):
+    # Sem `destino` devolve os bytes do XLSX, montado em memória (nada no diretório compartilhado)
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUNAS)
+    for serial, name in onus(origem, contagem):
+        sheet.append([serial, name])
+    saida = destino if destino is not None else io.BytesIO()
+    workbook.save(saida)
+    return saida.getvalue() if destino is None else destino
+
+
+def gerar_jsonl(origem, contagem=None):
+    # Mesmas linhas do XLSX no formato que o leitor da migração lê mais rápido, pra migrar direto.
+    # Sai em pedaços de bytes de uns TAMANHO_BLOCO: quem chama grava num arquivo ou junta, se precisar.
+    linhas, tamanho = [], 0
+    for serial, name in onus(origem, contagem):
+        linha = json.dumps({"Serial": serial, "Name": name}, ensure_ascii=False) + "\n"
+        linhas.append(linha)
+        tamanho += len(linha)
+        if tamanho >= TAMANHO_BLOCO:
+            yield "".join(linhas).encode("utf-8")
+            linhas, tamanho = [], 0
+    if linhas:
+        yield "".join(linhas).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte o JSON exportado pela OLT antiga na planilha da migração")
+    parser.add_argument("entrada", help="arquivo JSON exportado pela OLT")
+    parser.add_argument("-o", "--saida", help="XLSX de saída (padrão: mesmo nome da entrada com .xlsx)")
+    parser.add_argument("--migrar", action="store_true", help="migra direto, sem gravar XLSX")
+    parser.add_argument("--simular", action="store_true", help="com --migrar, só planeja e mostra o plano")
+    args = parser.parse_args()
+
+    contagem = {}
+    if args.migrar:
+        import app
+        # O JSONL vai pra um arquivo temporário, lido aos pedaços pela migração como qualquer planilha
+        with tempfile.NamedTemporaryFile("wb", suffix=".jsonl", delete=False) as temporario:
+            for pedaco in gerar_jsonl(args.entrada, contagem):
+                temporario.write(pedaco)
+        try:
+            resultado = app.processar_planilha(temporario.name, formato="jsonl", retomar=True, simular=args.simular)
+        finally:
+            os.remove(temporario.name)
+        print(f"lidos={contagem['lidos']} repetidos={contagem['repetidos']} sem_serial={contagem['sem_serial']}")
+        if "error" in resultado:
+            print(f"Erro: {resultado['error']}")
+            return 1
+        if resultado.get("simulacao"):
+            sys.stdout.write(resultado["script"])
+            print(f"total={resultado['total']} planejadas={resultado['planejadas']} falhas={resultado['falhas']}")
+        else:
+            print(f"total={resultado['total']} sucessos={resultado['sucessos']} falhas={resultado['falhas']}")
+        return 0 if not resultado["falhas"] else 2
+
+    saida = args.saida or os.path.splitext(args.entrada)[0] + ".xlsx"
+    gerar_xlsx(args.entrada, saida, contagem)
+    print(f"{saida}: {contagem['convertidos']} ONUs (lidos={contagem['lidos']} repetidos={contagem['repetidos']} "
+          f"sem_serial={contagem['sem_serial']})")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import logging
+import threading
+import time
+
+import parsers
+
+COMANDOS = ["configure terminal", "show pon onu uncfg", "exit"]
+
+
+class CacheUncfg:
+    # Índice serial -> PON do último "show pon onu uncfg" lido (um por execução, no planejamento)
+    def __init__(self, olt="padrao"):
+        self.olt = olt
+        self.indice = {}
+        self.atualizado_em = None
+        self.consultas_olt = 0
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        with self._lock:
+            self.indice = {}
+            self.atualizado_em = None
+
+    def atualizar(self, saida):
+        self.consultas_olt += 1
+        self.indice = indexar_uncfg(saida)
+        self.atualizado_em = time.monotonic()
+        logging.info(f"OLT {self.olt}: lista de ONUs não configuradas atualizada, {len(self.indice)} seriais")
+
+    def consultar(self, serial):
+        # Só o índice em memória, sem ir na OLT
+        return self.indice.get(str(serial).strip().upper())
+
+
+def indexar_uncfg(saida):
+    return {onu.serial: onu.pon for onu in parsers.parse_uncfg(saida)}
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+AUTORIZADA = "autorizada"
+FALHA = "falha"
+DESCOBERTA = "descoberta"
+ID_RESERVADO = "id_reservado"
+
+
+class Diario:
+    # Diário append-only (JSONL) do estado de cada ONU, pra retomar uma migração interrompida.
+    # O fsync vai em lote (a cada `fsync_a_cada` registros ou `intervalo_fsync` segundos) e no fechar().
+    def __init__(self, caminho, fsync_a_cada=50, intervalo_fsync=1.0):
+        self.caminho = caminho
+        self.fsync_a_cada = fsync_a_cada
+        self.intervalo_fsync = intervalo_fsync
+        self.estado = {}
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self._ultimo_fsync = time.monotonic()
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._carregar()
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+
+    def _carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        with open(self.caminho, "r", encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    # Última linha pela metade de uma execução que caiu no meio da escrita
+                    continue
+                anterior = self.estado.get(registro["serial"], {})
+                self.estado[registro["serial"]] = {**anterior, **registro}
+        logging.info(f"Diário {self.caminho}: {len(self.estado)} ONUs de execuções anteriores, "
+                     f"{sum(1 for r in self.estado.values() if r['estado'] == AUTORIZADA)} já autorizadas")
+
+    @staticmethod
+    def chave(serial):
+        return str(serial).strip().upper()
+
+    def consultar(self, serial):
+        return self.estado.get(self.chave(serial))
+
+    def concluida(self, serial):
+        registro = self.estado.get(self.chave(serial))
+        return registro is not None and registro["estado"] == AUTORIZADA
+
+    def registrar(self, serial, estado, **dados):
+        registro = {"ts": time.time(), "serial": self.chave(serial), "estado": estado, **dados}
+        with self._lock:
+            anterior = self.estado.get(registro["serial"], {})
+            self.estado[registro["serial"]] = {**anterior, **registro}
+            self._arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+            self._pendentes += 1
+            if self._pendentes >= self.fsync_a_cada or time.monotonic() - self._ultimo_fsync > self.intervalo_fsync:
+                self._sincronizar()
+
+    def _sincronizar(self):
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self._pendentes = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def fechar(self):
+        with self._lock:
+            if not self._arquivo.closed:
+                self._sincronizar()
+                self._arquivo.close()
+
+
+def caminho_para(origem, pasta="diarios"):
+    # Mesmo conteúdo de planilha -> mesmo diário, então reenviar a planilha retoma de onde parou
+    sha = hashlib.sha1()
+    if isinstance(origem, (bytes, bytearray)):
+        sha.update(origem)
+    else:
+        with open(origem, "rb") as arquivo:
+            for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+                sha.update(bloco)
+    return os.path.join(pasta, f"{sha.hexdigest()[:16]}.jsonl")
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+
+import paramiko
+
+import metricas
+
+# Tipos de falha na conversa com a OLT. `transitorio` diz se vale tentar de novo: timeout, canal
+# caindo e OLT ocupada passam sozinhos; SN duplicado ou perfil inexistente não.
+
+
+class ErroOLT(Exception):
+    tipo = "erro"
+    transitorio = False
+
+
+class ErroTransitorio(ErroOLT):
+    tipo = "transitorio"
+    transitorio = True
+
+
+class TempoEsgotado(ErroTransitorio, TimeoutError):
+    tipo = "timeout"
+
+
+class CanalFechado(ErroTransitorio, EOFError):
+    tipo = "canal_fechado"
+
+
+class ErroConexao(ErroTransitorio):
+    # Falhou abrindo a sessão: nenhum comando chegou na OLT, então repetir é sempre seguro
+    tipo = "conexao"
+
+
+class ErroAutenticacao(ErroConexao):
+    # A ZTE recusa login quando chegam muitos de uma vez; senha errada acaba abrindo o disjuntor
+    tipo = "autenticacao"
+
+
+class OltOcupada(ErroTransitorio):
+    tipo = "ocupada"
+
+
+class ErroConfiguracao(ErroOLT):
+    tipo = "configuracao"
+
+
+class SerialDuplicado(ErroConfiguracao):
+    tipo = "serial_duplicado"
+
+
+class IdOcupado(ErroConfiguracao):
+    tipo = "id_ocupado"
+
+
+class PerfilInvalido(ErroConfiguracao):
+    tipo = "perfil_invalido"
+
+
+class CircuitoAberto(ErroOLT):
+    tipo = "circuito_aberto"
+
+
+# Mensagens da CLI (depois do "%Error NNNN:" / "%Code NNNN:") -> tipo da falha; a primeira que casar vale
+REGRAS_CLI = [
+    (re.compile(r"SN (already )?exist|serial number.*exist", re.IGNORECASE), SerialDuplicado),
+    (re.compile(r"ONU.*already exist|ONU.*in use|already (been )?used", re.IGNORECASE), IdOcupado),
+    (re.compile(r"profile.*(not exist|does ?n[o']t exist|not found)|no such profile", re.IGNORECASE), PerfilInvalido),
+    (re.compile(r"busy|try again|please wait|in progress|locked by", re.IGNORECASE), OltOcupada),
+]
+
+
+def classificar_cli(erro, comando=None):
+    # parsers.ErroCli -> exceção tipada, com o comando que falhou na mensagem
+    mensagem = f"{comando}: {erro.linha}" if comando else erro.linha
+    for regra, classe in REGRAS_CLI:
+        if regra.search(erro.mensagem) or regra.search(erro.linha):
+            return classe(mensagem)
+    return ErroConfiguracao(mensagem)
+
+
+def classificar(erro):
+    # Exceção crua (socket, paramiko) -> tipada; o que não for de rede volta como veio
+    if isinstance(erro, ErroOLT):
+        return erro
+    if isinstance(erro, paramiko.AuthenticationException):
+        return ErroAutenticacao(str(erro) or type(erro).__name__)
+    if isinstance(erro, (OSError, EOFError, paramiko.SSHException)):
+        return ErroTransitorio(str(erro) or type(erro).__name__)
+    return erro
+
+
+def tipo(erro):
+    return getattr(classificar(erro), "tipo", "erro")
+
+
+class Politica:
+    # Backoff exponencial com jitter completo: espera um valor sorteado entre 0 e base * 2^tentativa
+    # (até o teto), pra várias PONs que falharam juntas não voltarem juntas
+    def __init__(self, tentativas=4, base=0.5, teto=10.0, aleatorio=None):
+        self.tentativas = tentativas
+        self.base = base
+        self.teto = teto
+        self._aleatorio = aleatorio or random.Random()
+
+    def espera(self, tentativa):
+        return self._aleatorio.uniform(0, min(self.teto, self.base * 2 ** tentativa))
+
+    def repetir(self, erro, tentativa, idempotente=True):
+        # Script que escreve na OLT só é repetido se nem chegou a ser enviado
+        if tentativa + 1 >= self.tentativas or not getattr(erro, "transitorio", False):
+            return False
+        return idempotente or isinstance(erro, ErroConexao)
+
+
+class Disjuntor:
+    # Por OLT: depois de `limite` falhas transitórias seguidas para de mandar comando por `pausa`
+    # segundos e as linhas dessa OLT falham na hora, sem gastar SSH. Passada a pausa, uma chamada
+    # de teste decide se fecha de novo ou volta a abrir.
+    def __init__(self, limite=5, pausa=30.0, olt=None):
+        self.limite = limite
+        self.pausa = pausa
+        self.olt = olt
+        self.falhas = 0
+        self.aberto_em = None
+        self._testando = False
+        self._lock = threading.Lock()
+
+    def rearmar(self):
+        with self._lock:
+            self.falhas = 0
+            self.aberto_em = None
+            self._testando = False
+
+    def liberar(self):
+        with self._lock:
+            if self.aberto_em is None:
+                return
+            restante = self.pausa - (time.monotonic() - self.aberto_em)
+            if restante > 0 or self._testando:
+                raise CircuitoAberto(f"OLT {self.olt} fora depois de {self.falhas} falhas seguidas, "
+                                     f"nova tentativa em {max(restante, 0):.0f}s")
+            self._testando = True
+
+    def sucesso(self):
+        with self._lock:
+            if self.aberto_em is not None:
+                logging.info(f"OLT {self.olt} respondeu de novo, disjuntor fechado")
+            self.falhas = 0
+            self.aberto_em = None
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            if self._testando or (self.aberto_em is None and self.falhas >= self.limite):
+                logging.warning(f"OLT {self.olt}: {self.falhas} falhas seguidas, pausando os comandos por {self.pausa:.0f}s")
+                self.aberto_em = time.monotonic()
+            self._testando = False
+
+
+def _depois_da_falha(erro, tentativa, politica, disjuntor, idempotente, olt):
+    # Retorna quanto esperar antes da próxima tentativa, ou None pra desistir
+    if getattr(erro, "transitorio", False):
+        disjuntor.falha()
+    else:
+        # A OLT respondeu (ou o erro nem é dela): não conta contra o disjuntor
+        disjuntor.sucesso()
+    if not politica.repetir(erro, tentativa, idempotente):
+        return None
+    espera = politica.espera(tentativa)
+    logging.warning(f"OLT {olt}: {erro} ({erro.tipo}), tentativa {tentativa + 2}/{politica.tentativas} em {espera:.1f}s")
+    metricas.observar("retentativa", espera, olt=olt)
+    return espera
+
+
+async def repetir_async(funcao, politica, disjuntor, idempotente=True, olt=None):
+    # `funcao` devolve a corrotina de uma tentativa; a espera entre tentativas não prende o loop
+    tentativa = 0
+    while True:
+        disjuntor.liberar()
+        try:
+            resultado = await funcao()
+        except Exception as e:
+            erro = classificar(e)
+            espera = _depois_da_falha(erro, tentativa, politica, disjuntor, idempotente, olt)
+            if espera is None:
+                if erro is e:
+                    raise
+                raise erro from e
+            await asyncio.sleep(espera)
+            tentativa += 1
+            continue
+        disjuntor.sucesso()
+        return resultado
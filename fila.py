@@ -0,0 +1,193 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+
+from progresso import Progresso
+
+# Fila de migrações em SQLite: a tela só enfileira a planilha e lê o andamento, e o worker
+# (worker.py, outro processo) roda o processar_planilha e publica progresso, logs e resultado.
+
+CAMINHO_PADRAO = os.path.join("fila", "migracoes.db")
+PENDENTE = "pendente"
+RODANDO = "rodando"
+CONCLUIDA = "concluida"
+# Tarefa rodando sem sinal do worker por esse tempo volta pra fila (worker caiu no meio); o diário
+# da migração faz a próxima execução pular o que já foi autorizado
+EXPIRA = 60
+LINHAS_LOGS = 500
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    estado TEXT NOT NULL,
+    arquivo BLOB NOT NULL,
+    opcoes TEXT NOT NULL,
+    progresso TEXT,
+    logs TEXT,
+    resultado TEXT,
+    worker TEXT,
+    criada_em REAL NOT NULL,
+    iniciada_em REAL,
+    atualizada_em REAL,
+    concluida_em REAL
+)
+"""
+
+
+def identificador():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Fila:
+    def __init__(self, caminho=None):
+        self.caminho = caminho or os.getenv("OLT_FILA") or CAMINHO_PADRAO
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._conectar() as conexao:
+            # WAL: a tela lê o andamento enquanto o worker escreve, sem um travar o outro
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(ESQUEMA)
+
+    def _conectar(self):
+        # Uma conexão por operação: a tela do Streamlit e o worker chamam de threads diferentes
+        conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        conexao.row_factory = sqlite3.Row
+        return _Conexao(conexao)
+
+    def enviar(self, arquivo, **opcoes):
+        # `opcoes` vão direto pro processar_planilha (formato, retomar, simular...)
+        with self._conectar() as conexao:
+            cursor = conexao.execute(
+                "INSERT INTO tarefas (estado, arquivo, opcoes, criada_em) VALUES (?, ?, ?, ?)",
+                (PENDENTE, bytes(arquivo), json.dumps(opcoes), time.time()),
+            )
+        return Tarefa(self, cursor.lastrowid)
+
+    def pegar(self, worker=None, expira=EXPIRA):
+        # Próxima tarefa pendente (ou abandonada por um worker que caiu) -> (id, arquivo, opcoes), ou None
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            linha = conexao.execute(
+                "SELECT id, arquivo, opcoes FROM tarefas WHERE estado = ? OR (estado = ? AND atualizada_em < ?) "
+                "ORDER BY id LIMIT 1",
+                (PENDENTE, RODANDO, agora - expira),
+            ).fetchone()
+            if linha is None:
+                conexao.execute("COMMIT")
+                return None
+            conexao.execute(
+                "UPDATE tarefas SET estado = ?, worker = ?, iniciada_em = ?, atualizada_em = ? WHERE id = ?",
+                (RODANDO, worker or identificador(), agora, agora, linha["id"]),
+            )
+            conexao.execute("COMMIT")
+        return linha["id"], linha["arquivo"], json.loads(linha["opcoes"])
+
+    def publicar(self, id, retrato, logs):
+        with self._conectar() as conexao:
+            conexao.execute(
+                "UPDATE tarefas SET progresso = ?, logs = ?, atualizada_em = ? WHERE id = ?",
+                (json.dumps(retrato), logs, time.time(), id),
+            )
+
+    def concluir(self, id, resultado, retrato, logs):
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute(
+                "UPDATE tarefas SET estado = ?, resultado = ?, progresso = ?, logs = ?, atualizada_em = ?, "
+                "concluida_em = ? WHERE id = ?",
+                (CONCLUIDA, json.dumps(resultado, default=str), json.dumps(retrato), logs, agora, agora, id),
+            )
+
+    def consultar(self, id):
+        with self._conectar() as conexao:
+            linha = conexao.execute(
+                "SELECT id, estado, progresso, logs, resultado, worker, criada_em, iniciada_em, concluida_em "
+                "FROM tarefas WHERE id = ?",
+                (id,),
+            ).fetchone()
+        if linha is None:
+            return None
+        tarefa = dict(linha)
+        for campo in ("progresso", "resultado"):
+            tarefa[campo] = json.loads(tarefa[campo]) if tarefa[campo] else None
+        return tarefa
+
+    def listar(self, quantidade=20):
+        # Últimas tarefas, sem o arquivo nem os logs
+        with self._conectar() as conexao:
+            linhas = conexao.execute(
+                "SELECT id, estado, progresso, worker, criada_em, iniciada_em, concluida_em "
+                "FROM tarefas ORDER BY id DESC LIMIT ?",
+                (quantidade,),
+            ).fetchall()
+        tarefas = []
+        for linha in linhas:
+            tarefa = dict(linha)
+            tarefa["progresso"] = json.loads(tarefa["progresso"]) if tarefa["progresso"] else None
+            tarefas.append(tarefa)
+        return tarefas
+
+
+class _Conexao:
+    # sqlite3.Connection como context manager só fecha a transação, não a conexão
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        return self.conexao
+
+    def __exit__(self, *erro):
+        self.conexao.close()
+
+
+class Tarefa:
+    # Mesma cara da progresso.MigracaoEmSegundoPlano pra tela (progresso.retrato(), logs.texto(),
+    # resultado e concluida()), lendo da fila o que o worker publicou
+    def __init__(self, fila, id, intervalo=0.5):
+        self.fila = fila
+        self.id = id
+        self.intervalo = intervalo
+        self.progresso = _RetratoFila(self)
+        self.logs = _LogsFila(self)
+        self._linha = None
+        self._lida_em = 0.0
+
+    def linha(self):
+        # Um redesenho da tela consulta várias vezes: uma leitura da fila serve pra todas
+        if self._linha is None or time.monotonic() - self._lida_em > self.intervalo:
+            self._linha = self.fila.consultar(self.id) or {}
+            self._lida_em = time.monotonic()
+        return self._linha
+
+    @property
+    def estado(self):
+        return self.linha().get("estado")
+
+    @property
+    def resultado(self):
+        return self.linha().get("resultado")
+
+    def concluida(self):
+        return self.estado == CONCLUIDA
+
+
+class _RetratoFila:
+    def __init__(self, tarefa):
+        self.tarefa = tarefa
+
+    def retrato(self):
+        # Enquanto o worker não pega a tarefa, o retrato é o de uma migração que nem começou
+        return self.tarefa.linha().get("progresso") or Progresso().retrato()
+
+
+class _LogsFila:
+    def __init__(self, tarefa):
+        self.tarefa = tarefa
+
+    def texto(self, ultimas=None):
+        linhas = (self.tarefa.linha().get("logs") or "").splitlines()
+        return "\n".join(linhas[-ultimas:] if ultimas else linhas)
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
+import alocador
+import descoberta
+import falhas
+import ssh_async
+
+# Nome da OLT montada a partir de OLT_HOST/OLT_PORT/... quando não existe arquivo de inventário
+PADRAO = "padrao"
+
+# Campos aceitos por OLT no inventário; o que faltar cai nas variáveis de ambiente de sempre.
+# uncfg_refresh não é mais usado (o uncfg é lido uma vez por execução) e só é aceito por compatibilidade.
+CAMPOS = ("host", "port", "username", "password", "max_sessoes", "timeout", "uncfg_refresh", "max_onu_por_pon")
+
+
+class Olt:
+    # Tudo que é de um equipamento: pool de sessões, cache de uncfg e alocador de IDs.
+    # Cada OLT tem seu próprio teto de sessões, então uma OLT a mais é vazão a mais sem pesar nas outras.
+    def __init__(self, nome, host, port, username, password, max_sessoes=None, timeout=None,
+                 uncfg_refresh=None, max_onu_por_pon=None):
+        self.nome = nome
+        self.parametros = (host, port, username, password, max_sessoes, timeout, uncfg_refresh, max_onu_por_pon)
+        self.max_sessoes = int(max_sessoes or os.getenv("OLT_MAX_SESSOES", "1"))
+        self.host = host
+        self.port = int(port or 22)
+        self.username = username
+        self.password = password
+        self.timeout = float(timeout or os.getenv("OLT_TIMEOUT_COMANDO", "30"))
+        # Descoberta de ONUs não configuradas: um "show pon onu uncfg" por execução
+        self.cache_uncfg = descoberta.CacheUncfg(olt=nome)
+        # IDs de ONU por PON alocados localmente, sem reler "show gpon onu state" antes de cada autorização
+        self.alocador = alocador.AlocadorOnuId(
+            maximo=int(max_onu_por_pon or os.getenv("OLT_MAX_ONU_POR_PON", "128")),
+            olt=nome,
+        )
+        # Falha transitória é repetida com backoff; falhas seguidas abrem o disjuntor e param a OLT
+        self.politica = falhas.Politica(
+            tentativas=int(os.getenv("OLT_TENTATIVAS", "4")),
+            base=float(os.getenv("OLT_BACKOFF_BASE", "0.5")),
+            teto=float(os.getenv("OLT_BACKOFF_TETO", "10")),
+        )
+        self.disjuntor = falhas.Disjuntor(
+            limite=int(os.getenv("OLT_DISJUNTOR_FALHAS", "5")),
+            pausa=float(os.getenv("OLT_DISJUNTOR_PAUSA", "30")),
+            olt=nome,
+        )
+        self.pool_async = None
+        self._trava_async = None
+        self._loop_async = None
+
+    async def executar_async(self, comandos, pipeline=False, idempotente=True):
+        # `idempotente=False` pra script que não pode ir duas vezes: só repete se nem chegou na OLT
+        return await falhas.repetir_async(lambda: self.obter_pool_async().executar(comandos, pipeline=pipeline),
+                                          self.politica, self.disjuntor, idempotente, self.nome)
+
+    def iniciar_async(self, tamanho=None):
+        # Pool e trava do asyncio presos ao loop que está rodando agora; cada execução começa os seus
+        # e fecha as sessões que sobraram da anterior
+        self.fechar_async()
+        self.pool_async = ssh_async.PoolSessoesOLTAsync(
+            self.host,
+            self.port,
+            self.username,
+            self.password,
+            tamanho=tamanho or self.max_sessoes,
+            timeout=self.timeout,
+            olt=self.nome,
+        )
+        self._trava_async = asyncio.Lock()
+        self._loop_async = asyncio.get_running_loop()
+
+    def obter_pool_async(self):
+        if self._loop_async is not asyncio.get_running_loop():
+            self.iniciar_async()
+        return self.pool_async
+
+    def obter_trava_async(self):
+        if self._loop_async is not asyncio.get_running_loop():
+            self.iniciar_async()
+        return self._trava_async
+
+    def fechar_async(self):
+        if self.pool_async is not None:
+            self.pool_async.fechar()
+
+    def invalidar(self):
+        self.cache_uncfg.invalidar()
+        self.alocador.invalidar()
+        self.disjuntor.rearmar()
+
+    def fechar(self):
+        self.fechar_async()
+
+
+_olts = {}
+_padrao = None
+_lock = threading.Lock()
+
+
+def ler(caminho=None):
+    # Inventário em JSON: {"padrao": "centro", "olts": {"centro": {"host": ..., "max_sessoes": 4}, ...}}
+    # Valores como "${OLT_CENTRO_SENHA}" são lidos do ambiente, pra senha não ficar no arquivo.
+    caminho = caminho or os.getenv("OLT_INVENTARIO", "olts.json")
+    if not os.path.exists(caminho):
+        if not os.getenv("OLT_HOST"):
+            raise ValueError(f"Nenhuma OLT configurada: crie {caminho} ou defina OLT_HOST no .env")
+        return PADRAO, {PADRAO: {
+            "host": os.getenv("OLT_HOST"),
+            "port": os.getenv("OLT_PORT"),
+            "username": os.getenv("OLT_USERNAME"),
+            "password": os.getenv("OLT_PASSWORD"),
+        }}
+
+    with open(caminho, encoding="utf-8") as arquivo:
+        dados = json.load(arquivo)
+    olts = {}
+    for nome, config in dados.get("olts", {}).items():
+        desconhecidos = set(config) - set(CAMPOS)
+        if desconhecidos:
+            raise ValueError(f"Campos desconhecidos na OLT {nome} do inventário: {', '.join(sorted(desconhecidos))}")
+        if not config.get("host"):
+            raise ValueError(f"OLT {nome} do inventário sem host")
+        olts[str(nome)] = {k: os.path.expandvars(v) if isinstance(v, str) else v for k, v in config.items()}
+    if not olts:
+        raise ValueError(f"Inventário {caminho} sem nenhuma OLT")
+    padrao = dados.get("padrao")
+    if padrao is not None and padrao not in olts:
+        raise ValueError(f"OLT padrão '{padrao}' não está no inventário")
+    return padrao or (next(iter(olts)) if len(olts) == 1 else None), olts
+
+
+def carregar(caminho=None):
+    # Relê o inventário a cada execução; OLT com a mesma configuração mantém o pool e as sessões abertas
+    global _padrao
+    padrao, configs = ler(caminho)
+    with _lock:
+        for nome in list(_olts):
+            if nome not in configs or _olts[nome].parametros != tuple(configs[nome].get(c) for c in CAMPOS):
+                _olts.pop(nome).fechar()
+        for nome, config in configs.items():
+            if nome not in _olts:
+                _olts[nome] = Olt(nome, **config)
+        _padrao = padrao
+    logging.info(f"Inventário com {len(configs)} OLT(s): {', '.join(configs)}")
+    return dict(_olts)
+
+
+def obter(nome=None):
+    # Linha sem OLT vai pra OLT padrão (a única, se o inventário só tiver uma)
+    if not _olts:
+        carregar()
+    nome = str(nome).strip() if nome is not None and str(nome).strip() else _padrao
+    if nome is None:
+        raise ValueError("Linha sem OLT e inventário sem OLT padrão")
+    olt = _olts.get(nome)
+    if olt is None:
+        raise ValueError(f"OLT desconhecida: {nome}")
+    return olt
+
+
+def todas():
+    return list(_olts.values())
+
+
+def fechar_todas():
+    # Fecha as sessões ociosas; os pools continuam pra próxima execução
+    with _lock:
+        for olt in _olts.values():
+            olt.fechar()
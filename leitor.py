@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+import math
+import os
+from itertools import chain, islice
+
+FORMATOS = ("xlsx", "csv", "jsonl")
+
+
+def valor_celula(valor):
+    # Célula vazia, só espaços ou NaN vira None; texto vem sem espaços nas pontas
+    if valor is None:
+        return None
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    if isinstance(valor, str):
+        valor = valor.strip()
+        return valor or None
+    return valor
+
+
+def detectar_formato(origem, nome=None):
+    nome = nome or (os.fspath(origem) if isinstance(origem, (str, os.PathLike)) else None)
+    if nome:
+        extensao = os.path.splitext(nome)[1].lower().lstrip(".")
+        if extensao in FORMATOS:
+            return extensao
+    if isinstance(origem, (bytes, bytearray)):
+        if origem[:2] == b"PK":
+            return "xlsx"
+        if origem.lstrip()[:1] == b"{":
+            return "jsonl"
+        return "csv"
+    return "xlsx"
+
+
+class LeitorPlanilha:
+    # Lê XLSX (openpyxl read_only), CSV ou JSONL linha a linha, sem carregar o arquivo inteiro.
+    # Aceita caminho ou bytes em memória (upload do Streamlit) e entrega (numero_da_linha, {coluna: valor}).
+    def __init__(self, origem, formato=None, nome=None):
+        self.formato = formato or detectar_formato(origem, nome)
+        if self.formato not in FORMATOS:
+            raise ValueError(f"Formato de planilha não suportado: {self.formato}")
+        self.colunas = []
+        self.total_estimado = None
+        if isinstance(origem, (bytes, bytearray)):
+            if self.formato != "xlsx":
+                # Texto em memória: contar quebras de linha é barato e dá o total pra barra de progresso
+                self.total_estimado = origem.count(b"\n") - (1 if self.formato == "csv" else 0)
+            origem = io.BytesIO(origem)
+        self.origem = origem
+        self._linhas = self._abrir()
+
+    def _abrir(self):
+        if self.formato == "xlsx":
+            return self._abrir_xlsx()
+        if self.formato == "csv":
+            return self._abrir_csv()
+        return self._abrir_jsonl()
+
+    def _texto(self):
+        if isinstance(self.origem, (str, os.PathLike)):
+            self._arquivo = open(self.origem, "r", encoding="utf-8-sig", newline="")
+        else:
+            self._arquivo = io.TextIOWrapper(self.origem, encoding="utf-8-sig", newline="")
+        return self._arquivo
+
+    def _abrir_xlsx(self):
+        # openpyxl só é carregado quando aparece um XLSX; CSV e JSONL (e a tela) não pagam por ele
+        import openpyxl
+        self._workbook = openpyxl.load_workbook(self.origem, read_only=True, data_only=True)
+        sheet = self._workbook.active
+        if sheet.max_row:
+            self.total_estimado = sheet.max_row - 1
+        linhas = sheet.iter_rows(values_only=True)
+        cabecalho = next(linhas, None) or ()
+        self.colunas = [str(c).strip() if c is not None else "" for c in cabecalho]
+        return (
+            (numero, dict(zip(self.colunas, (valor_celula(v) for v in valores))))
+            for numero, valores in enumerate(linhas, start=2)
+            if any(v is not None for v in valores)
+        )
+
+    def _abrir_csv(self):
+        arquivo = self._texto()
+        leitor = csv.DictReader(arquivo)
+        self.colunas = [c.strip() for c in (leitor.fieldnames or [])]
+        return (
+            (numero, {c.strip(): valor_celula(v) for c, v in linha.items() if c is not None})
+            for numero, linha in enumerate(leitor, start=2)
+        )
+
+    def _abrir_jsonl(self):
+        linhas = (
+            (numero, json.loads(texto))
+            for numero, texto in enumerate(self._texto(), start=1)
+            if texto.strip()
+        )
+        primeira = next(linhas, None)
+        if primeira is None:
+            return iter(())
+        self.colunas = list(primeira[1])
+        return (
+            (numero, {c: valor_celula(v) for c, v in registro.items()})
+            for numero, registro in chain([primeira], linhas)
+        )
+
+    def __iter__(self):
+        return self._linhas
+
+    def fechar(self):
+        workbook = getattr(self, "_workbook", None)
+        if workbook is not None:
+            workbook.close()
+        arquivo = getattr(self, "_arquivo", None)
+        if arquivo is not None and isinstance(self.origem, (str, os.PathLike)):
+            arquivo.close()
+
+
+def previa(origem, n=100, formato=None, nome=None):
+    # Só as primeiras n linhas, pra mostrar na tela sem ler a planilha toda
+    leitor = LeitorPlanilha(origem, formato=formato, nome=nome)
+    try:
+        return leitor.colunas, [registro for numero, registro in islice(leitor, n)]
+    finally:
+        leitor.fechar()
@@ -0,0 +1,186 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites dos buckets dos histogramas de duração, em segundos (estilo Prometheus)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+
+class Serie:
+    def __init__(self):
+        self.chamadas = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self.bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observar(self, segundos, bytes_lidos):
+        self.chamadas += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+        self.bytes += bytes_lidos
+        for i, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                self.buckets[i] += 1
+                break
+
+    def percentil(self, p):
+        # Limite superior do bucket onde cai o percentil (o histograma não guarda as amostras)
+        alvo = p / 100 * self.chamadas
+        acumulado = 0
+        for limite, quantidade in zip(BUCKETS, self.buckets):
+            acumulado += quantidade
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def linha(self):
+        return {
+            "chamadas": self.chamadas,
+            "total_s": round(self.soma, 3),
+            "media_ms": round(self.soma / self.chamadas * 1000, 1) if self.chamadas else 0.0,
+            "p50_ms": round(self.percentil(50) * 1000, 1),
+            "p95_ms": round(self.percentil(95) * 1000, 1),
+            "max_ms": round(self.maximo * 1000, 1),
+            "bytes": self.bytes,
+        }
+
+
+class Metricas:
+    # Histogramas de duração (e bytes lidos) por etapa, com rótulos como olt e pon
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def zerar(self):
+        with self._lock:
+            self._series = {}
+
+    def observar(self, etapa, segundos, bytes_lidos=0, **rotulos):
+        chave = (etapa, tuple(sorted((k, str(v)) for k, v in rotulos.items())))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = Serie()
+            serie.observar(segundos, bytes_lidos)
+
+    def resumo(self):
+        # JSON: uma linha agregada por etapa e uma por etapa+rótulos (pra achar a PON/OLT lenta)
+        with self._lock:
+            series = list(self._series.items())
+        por_etapa = {}
+        for (etapa, rotulos), serie in series:
+            agregado = por_etapa.setdefault(etapa, Serie())
+            agregado.chamadas += serie.chamadas
+            agregado.soma += serie.soma
+            agregado.maximo = max(agregado.maximo, serie.maximo)
+            agregado.bytes += serie.bytes
+            agregado.buckets = [a + b for a, b in zip(agregado.buckets, serie.buckets)]
+        return {
+            "etapas": [{"etapa": etapa, **serie.linha()} for etapa, serie in sorted(por_etapa.items())],
+            "series": [
+                {"etapa": etapa, **dict(rotulos), **serie.linha()}
+                for (etapa, rotulos), serie in sorted(series, key=lambda item: -item[1].soma)
+            ],
+        }
+
+    def prometheus(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        linhas = [
+            "# HELP onu_migracao_etapa_segundos Duração de cada etapa da migração",
+            "# TYPE onu_migracao_etapa_segundos histogram",
+        ]
+        for (etapa, rotulos), serie in series:
+            base = ",".join([f'etapa="{etapa}"'] + [f'{k}="{v}"' for k, v in rotulos])
+            acumulado = 0
+            for limite, quantidade in zip(BUCKETS, serie.buckets):
+                acumulado += quantidade
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                linhas.append(f'onu_migracao_etapa_segundos_bucket{{{base},le="{le}"}} {acumulado}')
+            linhas.append(f"onu_migracao_etapa_segundos_sum{{{base}}} {serie.soma}")
+            linhas.append(f"onu_migracao_etapa_segundos_count{{{base}}} {serie.chamadas}")
+        linhas += [
+            "# HELP onu_migracao_bytes_lidos_total Bytes lidos da OLT em cada etapa",
+            "# TYPE onu_migracao_bytes_lidos_total counter",
+        ]
+        for (etapa, rotulos), serie in series:
+            base = ",".join([f'etapa="{etapa}"'] + [f'{k}="{v}"' for k, v in rotulos])
+            linhas.append(f"onu_migracao_bytes_lidos_total{{{base}}} {serie.bytes}")
+        return "\n".join(linhas) + "\n"
+
+
+# `acumulado` vale desde que o processo subiu (Prometheus); `execucao` é zerado a cada planilha
+acumulado = Metricas()
+execucao = Metricas()
+
+
+def observar(etapa, segundos, bytes_lidos=0, **rotulos):
+    acumulado.observar(etapa, segundos, bytes_lidos, **rotulos)
+    execucao.observar(etapa, segundos, bytes_lidos, **rotulos)
+
+
+# Bytes lidos da OLT dentro da etapa em andamento (por tarefa do asyncio, ou por thread)
+_bytes_etapa = contextvars.ContextVar("bytes_etapa", default=None)
+
+
+def contar_bytes(quantidade):
+    # Chamado por quem lê do canal SSH; soma na etapa aberta, se houver
+    contador = _bytes_etapa.get()
+    if contador is not None:
+        contador[0] += quantidade
+
+
+@contextmanager
+def etapa(nome, **rotulos):
+    # Duração e bytes lidos da OLT no bloco. Etapa dentro de etapa (uma conexão aberta no meio do
+    # registro) conta nas duas, como a duração
+    contador = [0]
+    token = _bytes_etapa.set(contador)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _bytes_etapa.reset(token)
+        contar_bytes(contador[0])
+        observar(nome, time.perf_counter() - inicio, contador[0], **rotulos)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            corpo = acumulado.prometheus().encode()
+            tipo = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            corpo = json.dumps(acumulado.resumo()).encode()
+            tipo = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+_servidor = None
+_servidor_lock = threading.Lock()
+
+
+def servir(porta, host="0.0.0.0"):
+    # /metrics (texto Prometheus) e /metrics.json; só sobe uma vez por processo
+    global _servidor
+    with _servidor_lock:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer((host, porta), _Handler)
+            threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+            logging.info(f"Métricas em http://{host}:{porta}/metrics")
+    return _servidor
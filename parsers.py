@@ -0,0 +1,110 @@
+import re
+from collections import namedtuple
+
+# Registros tipados do que sai da CLI da ZTE
+OnuNaoConfigurada = namedtuple("OnuNaoConfigurada", "pon serial modelo")
+EstadoOnu = namedtuple("EstadoOnu", "pon onu_id admin omcc fase canal")
+ErroCli = namedtuple("ErroCli", "codigo mensagem linha")
+
+# Tabelas da ZTE: colunas separadas por 2+ espaços no cabeçalho, valores sem espaço nas linhas
+SEPARADOR_COLUNAS_RE = re.compile(r"\s{2,}")
+TRACEJADO_RE = re.compile(r"^\s*-{5,}\s*$")
+INDICE_PON_RE = re.compile(r"^(?:gpon[_-](?:olt|onu)[_-])?(\d+/\d+/\d+)(?::(\d+))?$", re.IGNORECASE)
+ERRO_RE = re.compile(r"^\s*%\s*(Error|Code)\s*(\d+)?(?:-\w+)?\s*:?\s*(.*)$", re.IGNORECASE)
+SERIAL_DETALHE_RE = re.compile(r"^\s*Serial number\s*:\s*(\S+)", re.IGNORECASE)
+NOME_ONU_RE = re.compile(r"^\s+name\s+(\S+)\s*$")
+INVALIDO_RE = re.compile(r"^\s*%\s*(Invalid input|Unknown command|Incomplete command|Ambiguous command).*$", re.IGNORECASE)
+
+# "%Code 70405: No related information to show." é só show vazio, não erro
+CODIGOS_INFORMATIVOS = {"70405"}
+
+
+def _tabela(saida):
+    # Devolve (colunas_normalizadas, linhas_divididas) da primeira tabela com cabeçalho OnuIndex/OltIndex
+    colunas = None
+    for linha in saida.splitlines():
+        if colunas is None:
+            cabecalho = linha.strip()
+            if cabecalho.lower().startswith(("onuindex", "oltindex")):
+                colunas = [c.lower() for c in SEPARADOR_COLUNAS_RE.split(cabecalho)]
+            continue
+        if TRACEJADO_RE.match(linha) or not linha.strip():
+            continue
+        partes = linha.split()
+        if INDICE_PON_RE.match(partes[0]):
+            yield colunas, partes
+
+
+def _coluna(colunas, *nomes):
+    for nome in nomes:
+        if nome in colunas:
+            return colunas.index(nome)
+    return None
+
+
+def parse_uncfg(saida):
+    # "show pon onu uncfg" (C600: OltIndex/Model/SN/PW) ou "show gpon onu uncfg" (C300: OnuIndex/Sn/State)
+    registros = []
+    for colunas, partes in _tabela(saida):
+        pon = INDICE_PON_RE.match(partes[0]).group(1)
+        coluna_sn = _coluna(colunas, "sn")
+        coluna_modelo = _coluna(colunas, "model", "type")
+        if coluna_sn is None or coluna_sn >= len(partes):
+            continue
+        modelo = partes[coluna_modelo] if coluna_modelo is not None and coluna_modelo < len(partes) else None
+        registros.append(OnuNaoConfigurada(pon, partes[coluna_sn].upper(), modelo))
+    return registros
+
+
+def parse_estado_onus(saida):
+    # "show gpon onu state gpon_olt-X/Y/Z": uma linha por ONU configurada na porta
+    registros = []
+    for colunas, partes in _tabela(saida):
+        m = INDICE_PON_RE.match(partes[0])
+        if m.group(2) is None:
+            continue
+        valores = dict(zip(colunas, partes))
+        registros.append(EstadoOnu(
+            m.group(1),
+            int(m.group(2)),
+            valores.get("admin state"),
+            valores.get("omcc state"),
+            valores.get("phase state"),
+            valores.get("channel"),
+        ))
+    return registros
+
+
+def parse_nomes(saida):
+    # "show running-config | include name": os "name X" indentados são os das interfaces gpon_onu;
+    # "hostname" e afins ficam de fora por não terem recuo
+    nomes = set()
+    for linha in saida.splitlines():
+        m = NOME_ONU_RE.match(linha)
+        if m:
+            nomes.add(m.group(1))
+    return nomes
+
+
+def parse_serial_detalhe(saida):
+    # "show gpon onu detail-info gpon_onu-X/Y/Z:N": serial de quem está no ID (None se não tem ninguém)
+    for linha in saida.splitlines():
+        m = SERIAL_DETALHE_RE.match(linha)
+        if m:
+            return m.group(1).upper()
+    return None
+
+
+def parse_erros(saida):
+    # Só linhas de erro da própria CLI (%Error, %Code, Invalid input), não qualquer "Error" no meio do texto
+    erros = []
+    for linha in saida.splitlines():
+        m = ERRO_RE.match(linha)
+        if m:
+            if m.group(2) in CODIGOS_INFORMATIVOS:
+                continue
+            erros.append(ErroCli(m.group(2), m.group(3).strip(), linha.strip()))
+            continue
+        if INVALIDO_RE.match(linha):
+            erros.append(ErroCli(None, linha.strip().lstrip("%").strip(), linha.strip()))
+    return erros
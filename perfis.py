@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import threading
+
+# Perfil usado quando não existe perfis.json: o mesmo script que era fixo no código
+PADRAO = "padrao"
+EMBUTIDO = {
+    "tipo": "Bridge",
+    "tconts": {"1": "PLANO-500M"},
+    "gemports": {"1": 1},
+    "servicos": [{"gemport": 1, "vlan": 2003, "porta": "eth_0/1"}],
+}
+
+CAMPOS = ("tipo", "tconts", "gemports", "servicos")
+CAMPOS_SERVICO = ("gemport", "vlan", "porta", "user_vlan", "vport")
+
+
+def _vlan(valor, nome):
+    vlan = int(valor)
+    if not 1 <= vlan <= 4094:
+        raise ValueError(f"Perfil {nome}: VLAN {valor} fora de 1-4094")
+    return vlan
+
+
+class Perfil:
+    # Plano de serviço de uma ONU (tipo, T-CONTs, gemports, VLANs e service-ports), compilado uma vez:
+    # as linhas fixas ficam prontas e por ONU só entram a PON, o ID e o nome
+    def __init__(self, nome, tipo="Bridge", tconts=None, gemports=None, servicos=None):
+        self.nome = nome
+        self.tipo = tipo
+        tconts = {int(t): perfil for t, perfil in (tconts or {}).items()}
+        gemports = {int(g): int(t) for g, t in (gemports or {}).items()}
+        if not tconts or not gemports or not servicos:
+            raise ValueError(f"Perfil {nome} precisa de tconts, gemports e servicos")
+        for gemport, tcont in gemports.items():
+            if tcont not in tconts:
+                raise ValueError(f"Perfil {nome}: gemport {gemport} aponta pra tcont {tcont}, que não existe")
+
+        vports = {}
+        mng = []
+        mapas = []
+        for n, servico in enumerate(servicos, start=1):
+            desconhecidos = set(servico) - set(CAMPOS_SERVICO)
+            if desconhecidos:
+                raise ValueError(f"Perfil {nome}: campos desconhecidos no serviço {n}: {', '.join(sorted(desconhecidos))}")
+            gemport = int(servico["gemport"])
+            if gemport not in gemports:
+                raise ValueError(f"Perfil {nome}: serviço {n} usa o gemport {gemport}, que não existe")
+            vlan = _vlan(servico["vlan"], nome)
+            user_vlan = _vlan(servico.get("user_vlan", vlan), nome)
+            vport = int(servico.get("vport", gemport))
+            # Do lado da ONU (vport-map, service, vlan port) vale a user_vlan; a vlan da rede só
+            # aparece no service-port, que traduz uma na outra
+            mapas.append(f"vport-map {n} {vport} vlan {user_vlan}")
+            mng.append(f"service {n} gemport {gemport} vlan {user_vlan}")
+            mng.append(f"vlan port {servico.get('porta', 'eth_0/1')} mode tag vlan {user_vlan}")
+            vports.setdefault(vport, []).append(f"service-port {n} user-vlan {user_vlan} vlan {vlan}")
+
+        # Script montado uma vez, com buracos (None) só nas linhas que mudam por ONU
+        self._modelo = (
+            [None, None, "vport-mode manual"]
+            + [f"tcont {t} profile {perfil}" for t, perfil in sorted(tconts.items())]
+            + [f"gemport {g} tcont {t}" for g, t in sorted(gemports.items())]
+            + [f"vport {v} map-type vlan" for v in sorted(vports)]
+            + mapas
+            + ["exit"]
+        )
+        self._pos_mng = len(self._modelo)
+        self._modelo += [None] + mng + ["exit"]
+        self._pos_vports = []
+        for vport, linhas in sorted(vports.items()):
+            self._pos_vports.append((len(self._modelo), vport))
+            self._modelo += [None] + linhas + ["exit"]
+
+    def registro(self, onu_id, serial):
+        return f"onu {onu_id} type {self.tipo} sn {serial}"
+
+    def servico(self, pon, onu_id, nome):
+        comandos = self._modelo[:]
+        onu = f"{pon}:{onu_id}"
+        comandos[0] = f"interface gpon_onu-{onu}"
+        comandos[1] = f"name {nome}"
+        comandos[self._pos_mng] = f"pon-onu-mng gpon_onu-{onu}"
+        for posicao, vport in self._pos_vports:
+            comandos[posicao] = f"interface vport-{pon}.{onu_id}:{vport}"
+        return comandos
+
+
+_perfis = {PADRAO: Perfil(PADRAO, **EMBUTIDO)}
+_padrao = PADRAO
+_lock = threading.Lock()
+
+
+def ler(caminho=None):
+    # {"padrao": "500M", "perfis": {"500M": {"tipo": "Bridge", "tconts": {"1": "PLANO-500M"}, ...}}}
+    caminho = caminho or os.getenv("OLT_PERFIS", "perfis.json")
+    if not os.path.exists(caminho):
+        return PADRAO, {PADRAO: EMBUTIDO}
+    with open(caminho, encoding="utf-8") as arquivo:
+        dados = json.load(arquivo)
+    perfis = {}
+    for nome, config in dados.get("perfis", {}).items():
+        desconhecidos = set(config) - set(CAMPOS)
+        if desconhecidos:
+            raise ValueError(f"Campos desconhecidos no perfil {nome}: {', '.join(sorted(desconhecidos))}")
+        perfis[str(nome)] = config
+    if not perfis:
+        raise ValueError(f"Arquivo de perfis {caminho} sem nenhum perfil")
+    padrao = dados.get("padrao")
+    if padrao is not None and padrao not in perfis:
+        raise ValueError(f"Perfil padrão '{padrao}' não está em {caminho}")
+    return padrao or (next(iter(perfis)) if len(perfis) == 1 else None), perfis
+
+
+def carregar(caminho=None):
+    # Compila todos os perfis uma vez por execução; erro de configuração aparece antes de ir pra OLT
+    global _perfis, _padrao
+    padrao, configs = ler(caminho)
+    compilados = {nome: Perfil(nome, **config) for nome, config in configs.items()}
+    with _lock:
+        _perfis, _padrao = compilados, padrao
+    logging.info(f"Perfis de serviço: {', '.join(compilados)}")
+    return dict(compilados)
+
+
+def obter(nome=None):
+    # Linha sem perfil usa o padrão (o único, se o arquivo só tiver um)
+    nome = str(nome).strip() if nome is not None and str(nome).strip() else _padrao
+    if nome is None:
+        raise ValueError("Linha sem perfil e nenhum perfil padrão definido")
+    perfil = _perfis.get(nome)
+    if perfil is None:
+        raise ValueError(f"Perfil desconhecido: {nome}")
+    return perfil
@@ -0,0 +1,71 @@
+import os
+import re
+
+# Seriais GPON: 4 letras do fabricante + 8 hexadecimais (ZTEG1A2B3C4D)
+SERIAL_PADRAO = r"^[A-Z]{4}[0-9A-F]{8}$"
+# O name da ZTE é uma palavra só: espaço ou acento quebra o comando no meio do script de serviço
+NOME_RE = re.compile(r"^[A-Za-z0-9_.\-]+$")
+NOME_MAX = 32
+PON_RE = re.compile(r"^\d+/\d+/\d+$")
+
+# Nomes que já estão na OLT, pra não criar duas ONUs com o mesmo name
+COMANDOS_NOMES = ["configure terminal", "show running-config | include name", "exit"]
+
+
+def normalizar_serial(serial):
+    return str(serial).strip().upper()
+
+
+def normalizar_nome(nome):
+    # Nome numérico vindo do XLSX chega como 1001.0
+    if isinstance(nome, float) and nome.is_integer():
+        nome = int(nome)
+    return str(nome).strip()
+
+
+def validar_pon(pon):
+    if not pon:
+        return "PON inválida."
+    if not PON_RE.match(pon):
+        return "Formato de PON inválido."
+    return None
+
+
+class Validador:
+    # Tudo que dá pra conferir sem falar com a OLT, numa passada só pela planilha:
+    # formato do serial e do nome e repetidos dentro da própria planilha
+    def __init__(self):
+        # Lidos aqui, não no import: o .env só é carregado depois (load_dotenv do app/web)
+        self.serial_re = re.compile(os.getenv("OLT_SERIAL_RE", SERIAL_PADRAO))
+        self.nome_max = int(os.getenv("OLT_NOME_MAX", str(NOME_MAX)))
+        self.seriais = {}
+        self.nomes = {}
+
+    def validar(self, index, serial, nome, olt=None):
+        if not self.serial_re.match(serial):
+            return f"Serial {serial} fora do formato esperado"
+        if len(nome) > self.nome_max:
+            return f"Nome {nome} com mais de {self.nome_max} caracteres"
+        if not NOME_RE.match(nome):
+            return f"Nome {nome} com caracteres não aceitos pela OLT (só letras, números, _ . -)"
+        if serial in self.seriais:
+            return f"Serial repetido na planilha (linha {self.seriais[serial]})"
+        # O nome só precisa ser único dentro da mesma OLT
+        if (olt, nome) in self.nomes:
+            return f"Nome repetido na planilha (linha {self.nomes[(olt, nome)]})"
+        self.seriais[serial] = index
+        self.nomes[(olt, nome)] = index
+        return None
+
+
+def texto_plano(plano):
+    # Script de cada PON do jeito que vai pra OLT, pra conferir antes de executar
+    blocos = []
+    chave = None
+    for item in plano:
+        if (item['olt'], item['pon']) != chave:
+            chave = (item['olt'], item['pon'])
+            blocos.append(f"! OLT {item['olt']}, PON {item['pon']}")
+        blocos.append(f"! linha {item['linha']}: {item['serial']} -> ID {item['onu_id']}")
+        blocos.extend(item['comandos'])
+    return "\n".join(blocos) + "\n"
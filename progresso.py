@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from collections import deque
+
+
+class Progresso:
+    # Canal de progresso da migração: o worker escreve, a tela lê um retrato de tempos em tempos
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total_estimado = None
+        self.processadas = 0
+        self.sucessos = 0
+        self.falhas = 0
+        self.serial_atual = None
+        self.inicio = None
+        self.fim = None
+
+    def iniciar(self, total_estimado):
+        with self._lock:
+            self.total_estimado = total_estimado
+            self.inicio = time.monotonic()
+
+    def atual(self, serial):
+        with self._lock:
+            self.serial_atual = serial
+
+    def registrar(self, ok):
+        with self._lock:
+            self.processadas += 1
+            if ok:
+                self.sucessos += 1
+            else:
+                self.falhas += 1
+
+    def finalizar(self):
+        with self._lock:
+            self.fim = time.monotonic()
+            self.serial_atual = None
+
+    def retrato(self):
+        with self._lock:
+            decorrido = ((self.fim or time.monotonic()) - self.inicio) if self.inicio else 0.0
+            vazao = self.processadas / decorrido if decorrido > 0 else 0.0
+            restantes = None
+            if self.total_estimado:
+                restantes = max(self.total_estimado - self.processadas, 0)
+            return {
+                "total_estimado": self.total_estimado,
+                "processadas": self.processadas,
+                "sucessos": self.sucessos,
+                "falhas": self.falhas,
+                "serial_atual": self.serial_atual,
+                "decorrido": decorrido,
+                "vazao": vazao,
+                "eta": restantes / vazao if restantes is not None and vazao > 0 else None,
+                "concluido": self.fim is not None,
+            }
+
+
+class BufferLogs(logging.Handler):
+    # Guarda só as últimas `capacidade` linhas de log, em vez de uma string que cresce pra sempre
+    def __init__(self, capacidade=2000, level=logging.INFO):
+        super().__init__(level)
+        self.linhas = deque(maxlen=capacidade)
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    def emit(self, record):
+        try:
+            self.linhas.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def texto(self, ultimas=None):
+        linhas = list(self.linhas)
+        return "\n".join(linhas[-ultimas:] if ultimas else linhas)
+
+
+class MigracaoEmSegundoPlano:
+    # Roda a migração numa thread, pra tela do Streamlit não ficar travada esperando
+    def __init__(self, funcao, *args, capacidade_logs=2000, **kwargs):
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.progresso = Progresso()
+        self.logs = BufferLogs(capacidade_logs)
+        self.resultado = None
+        self._thread = threading.Thread(target=self._rodar, name="migracao", daemon=True)
+
+    def iniciar(self):
+        logging.getLogger().addHandler(self.logs)
+        self._thread.start()
+        return self
+
+    def _rodar(self):
+        try:
+            self.resultado = self.funcao(*self.args, progresso=self.progresso, **self.kwargs)
+        except Exception as e:
+            logging.error(f"Erro na migração em segundo plano: {e}")
+            self.resultado = {"error": str(e)}
+        finally:
+            self.progresso.finalizar()
+            logging.getLogger().removeHandler(self.logs)
+
+    def concluida(self):
+        return not self._thread.is_alive()
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import paramiko
+
+import falhas
+import metricas
+import transcricao
+from ssh_pool import SessaoOLT, erro_conexao, separar_saida
+
+# Sessões SSH pro motor asyncio: a espera pelo prompt não prende thread nenhuma, o loop acorda
+# quando o canal do paramiko avisa (pelo fileno) que chegou dado. Milhares de sessões esperando a
+# OLT cabem num loop só. O handshake do paramiko continua bloqueante e roda no executor padrão.
+
+# Com um loop que não vigia o fileno (Proactor do Windows) a leitura consulta o canal nesse intervalo
+INTERVALO_SEM_LEITOR = 0.01
+
+
+class SessaoOLTAsync(SessaoOLT):
+    # Mesma leitura por prompt da SessaoOLT, com conectar/executar como corrotinas
+    async def conectar(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._abrir_shell)
+        self._reiniciar_leitura()
+        self._aprender_prompt(await self._ler_ate_prompt(self.timeout))
+
+    def _abrir_shell(self):
+        self.fechar()
+        self.ssh = paramiko.SSHClient()
+        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.ssh.connect(self.host, port=self.port, username=self.username, password=self.password,
+                         timeout=self.timeout)
+        self.shell = self.ssh.invoke_shell()
+        # Cria o pipe de aviso do canal antes de chegar qualquer dado
+        self.shell.fileno()
+
+    async def _esperar_dados(self, restante):
+        # O paramiko deixa o fileno do canal legível enquanto tiver dado no buffer (ou o canal fechar)
+        loop = asyncio.get_running_loop()
+        pronto = loop.create_future()
+        fd = self.shell.fileno()
+        try:
+            loop.add_reader(fd, lambda: pronto.done() or pronto.set_result(None))
+        except NotImplementedError:
+            # Loop sem add_reader (o Proactor, padrão no Windows): volta a olhar o recv_ready daqui a pouco
+            await asyncio.sleep(min(restante, INTERVALO_SEM_LEITOR))
+            return
+        try:
+            await asyncio.wait_for(pronto, restante)
+        finally:
+            loop.remove_reader(fd)
+
+    async def _ler_ate_prompt(self, timeout):
+        shell = self.shell
+        loop = asyncio.get_running_loop()
+        novo = self._comecar_leitura()
+        limite = loop.time() + timeout
+
+        while True:
+            if novo:
+                texto, paginar = self._consumir(novo)
+                if paginar:
+                    shell.send(" ")
+                elif texto is not None:
+                    return texto
+
+            if shell.recv_ready():
+                novo = self._decodificar(shell.recv(65536))
+                continue
+            if shell.closed or shell.eof_received:
+                raise falhas.CanalFechado(f"Canal SSH com a OLT {self.host} foi fechado")
+            restante = limite - loop.time()
+            if restante <= 0:
+                raise falhas.TempoEsgotado(f"OLT {self.host} não devolveu o prompt em {timeout}s")
+            try:
+                await self._esperar_dados(restante)
+            except asyncio.TimeoutError:
+                pass
+            novo = ""
+
+    async def executar(self, comandos, timeout=None, pipeline=False):
+        timeout = timeout or self.timeout
+        saidas = []
+        inicio = time.perf_counter()
+        lidos = self.bytes_lidos
+
+        # Os scripts cabem folgados na janela do canal SSH, então o send não chega a bloquear o loop
+        if pipeline:
+            self.shell.sendall("".join(f"{comando}\n" for comando in comandos))
+        for comando in comandos:
+            if not pipeline:
+                self.shell.sendall(f"{comando}\n")
+            saidas.append(separar_saida(await self._ler_ate_prompt(timeout), comando))
+
+        metricas.observar("cli", time.perf_counter() - inicio, self.bytes_lidos - lidos, olt=self.olt)
+        transcricao.registrar(self.host, comandos, saidas)
+        return saidas
+
+
+class PoolSessoesOLTAsync:
+    # Mantém até `tamanho` shells abertos e reaproveita entre os lotes de comandos, assim o handshake
+    # SSH acontece uma vez por sessão e não uma vez por lote. Tem que ser criado com o loop já rodando
+    # (no Python 3.9 os primitivos do asyncio se prendem ao loop na criação).
+    def __init__(self, host, port, username, password, tamanho=1, timeout=30, olt=None):
+        self.host = host
+        self.olt = olt or host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self.handshakes = 0
+        self._livres = asyncio.LifoQueue()
+        self._criadas = 0
+
+    async def _conectar(self, sessao):
+        with metricas.etapa("ssh_conexao", olt=self.olt), erro_conexao(self.host):
+            await sessao.conectar()
+        self.handshakes += 1
+        logging.info(f"Sessão SSH aberta com a OLT {self.host}:{self.port} (handshakes: {self.handshakes})")
+
+    async def _adquirir(self):
+        while True:
+            if self._livres.empty() and self._criadas < self.tamanho:
+                self._criadas += 1
+                sessao = SessaoOLTAsync(self.host, self.port, self.username, self.password, timeout=self.timeout,
+                                        olt=self.olt)
+                try:
+                    await self._conectar(sessao)
+                except BaseException:
+                    self._criadas -= 1
+                    sessao.fechar()
+                    raise
+                return sessao
+            sessao = await self._livres.get()
+            # None é o aviso de que uma sessão foi descartada e abriu vaga pra outra
+            if sessao is not None:
+                return sessao
+
+    def _descartar(self, sessao):
+        sessao.fechar()
+        self._criadas -= 1
+        self._livres.put_nowait(None)
+
+    @asynccontextmanager
+    async def sessao(self):
+        sessao = await self._adquirir()
+        try:
+            if not sessao.ativa():
+                logging.warning(f"Sessão com a OLT {self.host} caiu, reconectando...")
+                sessao.fechar()
+                await self._conectar(sessao)
+            yield sessao
+        except BaseException:
+            # Inclui o cancelamento da tarefa: o shell ficou no meio de um comando e não volta pro pool
+            self._descartar(sessao)
+            raise
+        else:
+            self._livres.put_nowait(sessao)
+
+    async def executar(self, comandos, timeout=None, pipeline=False):
+        async with self.sessao() as sessao:
+            return await sessao.executar(comandos, timeout=timeout, pipeline=pipeline)
+
+    def fechar(self):
+        while not self._livres.empty():
+            sessao = self._livres.get_nowait()
+            if sessao is not None:
+                sessao.fechar()
+                self._criadas -= 1
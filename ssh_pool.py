@@ -0,0 +1,125 @@
+import paramiko
+import codecs
+import re
+from contextlib import contextmanager
+
+import falhas
+import metricas
+
+
+# Prompt da ZTE: "hostname#", "hostname(config)#", "hostname(config-if)#", "hostname(gpon-onu-mng)#"...
+PROMPT_RE = re.compile(r"(?:^|\n)([\w.\-/]+)(?:\([\w.\-/]+\))?#[ \t]*$")
+ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+MORE = "--More--"
+
+
+def limpar_saida(texto):
+    # Tira paginação, backspaces e sequências de terminal deixadas pelo --More--
+    texto = ANSI_RE.sub("", texto).replace(MORE, "").replace("\x08", "")
+    linhas = []
+    for linha in texto.split("\n"):
+        # "\r" sem "\n" volta o cursor: vale o último trecho que sobrou escrito na linha
+        trechos = [t for t in linha.split("\r") if t.strip()]
+        linhas.append(trechos[-1].rstrip() if trechos else "")
+    return "\n".join(linhas)
+
+
+def separar_saida(texto, comando):
+    # Tira o eco do comando (primeira linha) e o prompt (última)
+    linhas = limpar_saida(texto).split("\n")
+    if linhas and linhas[0].strip().endswith(comando.strip()):
+        linhas = linhas[1:]
+    return "\n".join(linhas[:-1]).strip("\n")
+
+
+class SessaoOLT:
+    # Um shell interativo autenticado que fica aberto durante toda a migração: estado da leitura por
+    # prompt e --More--, sem I/O; o envio e a espera ficam no ssh_async.SessaoOLTAsync
+    def __init__(self, host, port, username, password, timeout=30, olt=None):
+        self.host = host
+        # Rótulo das métricas: o nome da OLT no inventário, como nas outras etapas
+        self.olt = olt or host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.ssh = None
+        self.shell = None
+        self.prompt_re = None
+        self._sobra = ""
+        self._decoder = None
+        self.bytes_lidos = 0
+
+    def _reiniciar_leitura(self):
+        self.prompt_re = None
+        self._sobra = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def _aprender_prompt(self, banner):
+        # Consome o banner e aprende o hostname pelo primeiro prompt
+        hostname = PROMPT_RE.search(limpar_saida(banner)).group(1)
+        self.prompt_re = re.compile(r"\n\r*" + re.escape(hostname) + r"(?:\([\w.\-/]+\))?#")
+
+    def ativa(self):
+        if self.ssh is None or self.shell is None:
+            return False
+        transport = self.ssh.get_transport()
+        return transport is not None and transport.is_active() and not self.shell.closed
+
+    def fechar(self):
+        if self.ssh is not None:
+            try:
+                self.ssh.close()
+            except Exception:
+                pass
+        self.ssh = None
+        self.shell = None
+
+    def _comecar_leitura(self):
+        # O que sobrou depois do prompt da leitura anterior (comandos enviados em sequência) entra primeiro
+        self._partes = []
+        self._janela = ""
+        self._tamanho = 0
+        novo = self._sobra
+        self._sobra = ""
+        return novo
+
+    def _consumir(self, novo):
+        # Retorna (texto até o prompt ou None se ainda não chegou, se precisa responder um --More--)
+        self._partes.append(novo)
+        self._tamanho += len(novo)
+        self._janela = self._janela[-512:] + novo
+
+        if self._janela.rstrip().endswith(MORE):
+            self._janela = ""
+            return None, True
+        if self.prompt_re is None:
+            if PROMPT_RE.search(self._janela.replace("\r", "")):
+                return "".join(self._partes), False
+            return None, False
+        m = self.prompt_re.search(self._janela)
+        if m:
+            texto = "".join(self._partes)
+            corte = self._tamanho - len(self._janela) + m.end()
+            self._sobra = texto[corte:]
+            return texto[:corte], False
+        return None, False
+
+    def _decodificar(self, dados):
+        if not dados:
+            raise falhas.CanalFechado(f"Canal SSH com a OLT {self.host} foi fechado")
+        self.bytes_lidos += len(dados)
+        metricas.contar_bytes(len(dados))
+        return self._decoder.decode(dados)
+
+
+@contextmanager
+def erro_conexao(host):
+    # Qualquer falha abrindo a sessão vira ErroConexao: nada foi enviado ainda, repetir é seguro
+    try:
+        yield
+    except paramiko.AuthenticationException as e:
+        raise falhas.ErroAutenticacao(f"OLT {host} recusou o login: {e}") from e
+    except (OSError, EOFError, paramiko.SSHException, falhas.ErroOLT) as e:
+        raise falhas.ErroConexao(f"Não foi possível conectar à OLT {host}: {e}") from e
+
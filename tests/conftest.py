@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz (e a OLT simulada em benchmarks/), sem pacote instalado
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    # Uma OLT só (a "padrao", montada das variáveis de ambiente), perfil padrão, e diários e
+    # transcrições numa pasta temporária; nada do .env de quem roda os testes
+    for nome in list(os.environ):
+        if nome.startswith("OLT_"):
+            monkeypatch.delenv(nome)
+    monkeypatch.setenv("OLT_INVENTARIO", str(tmp_path / "olts.json"))
+    monkeypatch.setenv("OLT_PERFIS", str(tmp_path / "perfis.json"))
+    monkeypatch.setenv("OLT_HOST", "127.0.0.1")
+    monkeypatch.setenv("OLT_USERNAME", "admin")
+    monkeypatch.setenv("OLT_PASSWORD", "admin")
+    monkeypatch.setenv("OLT_DIARIO_DIR", str(tmp_path / "diarios"))
+    monkeypatch.setenv("OLT_TRANSCRICAO_DIR", str(tmp_path / "transcricoes"))
+    monkeypatch.setenv("OLT_BACKOFF_BASE", "0.01")
+    return tmp_path
@@ -0,0 +1,181 @@
+import pytest
+
+import app
+import falhas
+import inventario
+import perfis
+
+PON = "1/1/1"
+OCUPADO = "%Error 20209: ONU {} already exists."
+BUSY = "%Error 10001: The system is busy, please try again later."
+SN_DUPLICADO = "%Code 32310-GPONSRV : SN already exists."
+
+
+@pytest.fixture
+def olt(ambiente):
+    inventario.carregar()
+    perfis.carregar()
+    dispositivo = inventario.obter()
+    dispositivo.invalidar()
+    return dispositivo
+
+
+def estado(*ids):
+    # "show gpon onu state" da PON com esses IDs ocupados
+    if not ids:
+        return "%Code 70405: No related information to show."
+    linhas = ["OnuIndex        Admin State  OMCC State  Phase State  Channel", "-" * 62]
+    linhas += [f"{PON}:{i:<12}enable       enable      working      1(GPON)" for i in ids]
+    return "\n".join(linhas)
+
+
+def onus(quantidade, **extra):
+    return [{"serial": f"ZTEG0000000{n}", "name": f"cliente-{n}", "pon": PON, **extra}
+            for n in range(1, quantidade + 1)]
+
+
+class OltDeMentira:
+    # Responde os passos do app.passos_autorizacao sem SSH. `ocupados` é o que a OLT tem na PON;
+    # `respostas` troca a resposta de um registro (pelo serial) por uma mensagem de erro, uma vez;
+    # `cair_depois` derruba o canal depois de tantos registros do script; `erro` recusa todo registro
+    def __init__(self, ocupados=(), respostas=None, cair_depois=None, erro=None):
+        self.ocupados = dict(ocupados)
+        self.respostas = dict(respostas or {})
+        self.cair_depois = cair_depois
+        self.erro = erro
+        self.passos = []
+
+    def __call__(self, etapa, comandos):
+        self.passos.append((etapa, comandos))
+        if etapa == "consulta_ids":
+            return ["", estado(*sorted(self.ocupados)), ""]
+        if etapa == "registro" and self.erro is not None:
+            raise self.erro
+        saidas = []
+        for comando in comandos:
+            partes = comando.split()
+            if etapa != "registro" or partes[0] != "onu":
+                saidas.append("")
+                continue
+            if self.cair_depois is not None and len(saidas) - 2 == self.cair_depois:
+                # O que já foi aplicado fica na OLT
+                self.cair_depois = None
+                raise falhas.CanalFechado("Canal SSH com a OLT 127.0.0.1 foi fechado")
+            resposta = self.respostas.pop(partes[5], None)
+            if resposta is None and int(partes[1]) in self.ocupados:
+                resposta = OCUPADO.format(partes[1])
+            if resposta is None:
+                self.ocupados[int(partes[1])] = partes[5]
+            saidas.append(resposta or "")
+        return saidas
+
+    def etapas(self):
+        return [etapa for etapa, _ in self.passos]
+
+    def registros(self):
+        # (ID, serial) de cada "onu N type ... sn S", por script de registro enviado
+        return [[(int(c.split()[1]), c.split()[5]) for c in comandos if c.startswith("onu ")]
+                for etapa, comandos in self.passos if etapa == "registro"]
+
+
+def conduzir(passos, responder):
+    # Mesmo laço do app.conduzir_async, sem rede e sem dormir
+    saidas, erro = None, None
+    while True:
+        try:
+            etapa, comandos, _ = passos.throw(erro) if erro is not None else passos.send(saidas)
+        except StopIteration as fim:
+            return fim.value
+        saidas, erro = None, None
+        if etapa == "espera":
+            responder.passos.append(("espera", comandos))
+            continue
+        try:
+            saidas = responder(etapa, comandos)
+        except Exception as e:
+            erro = e
+
+
+def status(resultados):
+    return [codigo for _, codigo in resultados]
+
+
+def test_lote_registra_e_configura_com_ids_livres(olt):
+    lote = onus(3)
+    resposta = OltDeMentira(ocupados={1: "ZTEGOUTRA0001"})
+    resultados = conduzir(app.passos_autorizacao(PON, lote), resposta)
+
+    assert status(resultados) == [200, 200, 200]
+    assert [onu["onu_id"] for onu in lote] == [2, 3, 4]
+    assert resposta.etapas() == ["consulta_ids", "registro", "servico"]
+
+
+def test_id_ocupado_por_outra_onu_vai_pro_proximo_livre(olt):
+    # Planejamento reservou o ID 1, mas outra ONU foi registrada nele por fora antes da execução
+    olt.alocador.carregar(PON, estado())
+    lote = onus(1, onu_id=olt.alocador.reservar(PON))
+    resposta = OltDeMentira(ocupados={1: "ZTEGOUTRA0001"})
+    resultados = conduzir(app.passos_autorizacao(PON, lote), resposta)
+
+    assert status(resultados) == [200]
+    assert lote[0]["onu_id"] == 2
+    assert resposta.etapas() == ["registro", "consulta_ids", "registro", "servico"]
+    assert resposta.ocupados == {1: "ZTEGOUTRA0001", 2: "ZTEG00000001"}
+
+
+def test_olt_ocupada_espera_e_repete_no_mesmo_id(olt):
+    lote = onus(2)
+    resposta = OltDeMentira(respostas={"ZTEG00000002": BUSY})
+    resultados = conduzir(app.passos_autorizacao(PON, lote), resposta)
+
+    assert status(resultados) == [200, 200]
+    assert [onu["onu_id"] for onu in lote] == [1, 2]
+    assert resposta.etapas() == ["consulta_ids", "registro", "consulta_ids", "espera", "registro", "servico"]
+    assert resposta.registros()[1] == [(2, "ZTEG00000002")]
+
+
+def test_queda_no_meio_do_registro_rele_a_pon_e_so_repete_quem_faltou(olt):
+    lote = onus(3)
+    resposta = OltDeMentira(cair_depois=1)
+    resultados = conduzir(app.passos_autorizacao(PON, lote), resposta)
+
+    assert status(resultados) == [200, 200, 200]
+    assert resposta.etapas() == ["consulta_ids", "registro", "consulta_ids", "espera", "registro", "servico"]
+    assert resposta.registros()[1] == [(2, "ZTEG00000002"), (3, "ZTEG00000003")]
+    assert resposta.ocupados == {1: "ZTEG00000001", 2: "ZTEG00000002", 3: "ZTEG00000003"}
+
+
+def test_serial_duplicado_falha_e_devolve_o_id(olt):
+    lote = onus(2)
+    resposta = OltDeMentira(respostas={"ZTEG00000001": SN_DUPLICADO})
+    resultados = conduzir(app.passos_autorizacao(PON, lote), resposta)
+
+    assert status(resultados) == [500, 200]
+    assert resultados[0][0]["tipo"] == "serial_duplicado"
+    assert resposta.etapas() == ["consulta_ids", "registro", "consulta_ids", "servico"]
+    # O ID 1 não ficou com ninguém e volta pra fila
+    assert olt.alocador.reservar(PON) == 1
+
+
+def test_erro_definitivo_no_envio_libera_os_ids(olt):
+    lote = onus(2)
+    resposta = OltDeMentira(erro=falhas.ErroConfiguracao("% Invalid input detected at '^' marker."))
+    resultados = conduzir(app.passos_autorizacao(PON, lote), resposta)
+
+    assert status(resultados) == [500, 500]
+    assert resposta.etapas() == ["consulta_ids", "registro"]
+    assert [olt.alocador.reservar(PON), olt.alocador.reservar(PON)] == [1, 2]
+
+
+def test_onu_ja_registrada_vai_direto_pro_servico(olt):
+    # Retomada: a execução anterior registrou a ONU no ID 5 e parou antes do serviço
+    lote = onus(1, onu_id=5, registrada=True)
+    resposta = OltDeMentira(ocupados={5: "ZTEG00000001"})
+    resultados = conduzir(app.passos_autorizacao(PON, lote), resposta)
+
+    assert status(resultados) == [200]
+    assert lote[0]["onu_id"] == 5
+    assert "registro" not in resposta.etapas()
+    servico = resposta.passos[-1][1]
+    assert f"interface gpon_onu-{PON}:5" in servico
+    assert not any(comando.startswith("onu ") for comando in servico)
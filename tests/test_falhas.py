@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+import falhas
+import parsers
+
+
+def erro_cli(saida, comando="onu 1 type F670LV9.0 sn ZTEG00000001"):
+    return falhas.classificar_cli(parsers.parse_erros(saida)[0], comando)
+
+
+@pytest.mark.parametrize("saida, classe, transitorio", [
+    ("%Error 10001: The system is busy, please try again later.", falhas.OltOcupada, True),
+    ("%Code 32310-GPONSRV : SN already exists.", falhas.SerialDuplicado, False),
+    ("%Error 20209: ONU 1 already exists.", falhas.IdOcupado, False),
+    ("%Error 20003: Parameter out of range.", falhas.ErroConfiguracao, False),
+])
+def test_classificar_cli(saida, classe, transitorio):
+    erro = erro_cli(saida)
+    assert type(erro) is classe
+    assert erro.transitorio is transitorio
+    assert erro.args[0].startswith("onu 1 type")
+
+
+def test_classificar_erros_de_rede_viram_transitorios():
+    assert isinstance(falhas.classificar(EOFError("canal")), falhas.ErroTransitorio)
+    assert isinstance(falhas.classificar(OSError("reset")), falhas.ErroTransitorio)
+    assert falhas.tipo(ValueError("outra coisa")) == "erro"
+
+
+def test_politica_so_repete_script_de_escrita_que_nem_chegou_na_olt():
+    politica = falhas.Politica(tentativas=3)
+    assert politica.repetir(falhas.TempoEsgotado("t"), 0)
+    assert not politica.repetir(falhas.TempoEsgotado("t"), 2)
+    assert not politica.repetir(falhas.SerialDuplicado("sn"), 0)
+    # Registro: timeout no meio pode ter aplicado metade, só a conexão que nem abriu é repetida
+    assert not politica.repetir(falhas.TempoEsgotado("t"), 0, idempotente=False)
+    assert politica.repetir(falhas.ErroConexao("c"), 0, idempotente=False)
+
+
+def test_disjuntor_abre_depois_de_falhas_seguidas_e_fecha_com_sucesso():
+    disjuntor = falhas.Disjuntor(limite=3, pausa=60, olt="teste")
+    disjuntor.falha()
+    disjuntor.falha()
+    disjuntor.sucesso()
+    disjuntor.falha()
+    disjuntor.falha()
+    disjuntor.liberar()
+    disjuntor.falha()
+    with pytest.raises(falhas.CircuitoAberto):
+        disjuntor.liberar()
+    disjuntor.rearmar()
+    disjuntor.liberar()
+
+
+def test_disjuntor_deixa_uma_tentativa_de_teste_depois_da_pausa():
+    disjuntor = falhas.Disjuntor(limite=1, pausa=0, olt="teste")
+    disjuntor.falha()
+    disjuntor.liberar()
+    # Só uma chamada de teste por vez; a próxima espera o resultado dela
+    with pytest.raises(falhas.CircuitoAberto):
+        disjuntor.liberar()
+    disjuntor.falha()
+    disjuntor.liberar()
+    disjuntor.sucesso()
+    disjuntor.liberar()
+    disjuntor.liberar()
+
+
+def repetir(funcao, idempotente=True, limite=5):
+    politica = falhas.Politica(tentativas=4, base=0)
+    disjuntor = falhas.Disjuntor(limite=limite, pausa=60, olt="teste")
+    return asyncio.run(falhas.repetir_async(funcao, politica, disjuntor, idempotente, "teste")), disjuntor
+
+
+def sequencia(*respostas):
+    # Corrotina que devolve (ou levanta) uma resposta por chamada
+    chamadas = []
+
+    async def funcao():
+        resposta = respostas[len(chamadas)]
+        chamadas.append(resposta)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    return funcao, chamadas
+
+
+def test_repetir_async_passa_por_falha_transitoria():
+    funcao, chamadas = sequencia(EOFError("canal"), falhas.TempoEsgotado("t"), "ok")
+    resultado, disjuntor = repetir(funcao)
+    assert resultado == "ok"
+    assert len(chamadas) == 3
+    assert disjuntor.falhas == 0
+
+
+def test_repetir_async_nao_repete_erro_definitivo():
+    funcao, chamadas = sequencia(falhas.SerialDuplicado("sn"), "ok")
+    with pytest.raises(falhas.SerialDuplicado):
+        repetir(funcao)
+    assert len(chamadas) == 1
+
+
+def test_repetir_async_abre_o_disjuntor():
+    funcao, chamadas = sequencia(*[falhas.CanalFechado("c")] * 4)
+    with pytest.raises(falhas.CircuitoAberto):
+        repetir(funcao, limite=2)
+    assert len(chamadas) == 2
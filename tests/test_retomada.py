@@ -0,0 +1,121 @@
+import pytest
+
+import app
+import diario
+import fake_olt
+
+PONS = ["1/1/1", "1/1/2"]
+
+
+@pytest.fixture
+def subir_olt(ambiente, monkeypatch):
+    # OLT ZTE simulada (benchmarks/fake_olt.py) numa porta livre, com uma sessão só: com a semente
+    # fixa, as quedas e os "busy" caem sempre nos mesmos comandos
+    monkeypatch.setenv("OLT_MAX_SESSOES", "1")
+    monkeypatch.setenv("OLT_VERIFICAR", "0")
+    olts = []
+
+    def subir(estado, **opcoes):
+        olt = fake_olt.FakeOLT(estado, **opcoes).iniciar()
+        monkeypatch.setenv("OLT_PORT", str(olt.porta))
+        olts.append(olt)
+        return olt
+
+    yield subir
+    for olt in olts:
+        olt.parar()
+
+
+def planilha(seriais):
+    return ("Serial,Name\n" + "".join(f"{s},cliente-{n}\n" for n, s in enumerate(seriais))).encode()
+
+
+def migrar(seriais, **opcoes):
+    return app.processar_planilha(planilha(seriais), formato="csv", **opcoes)
+
+
+def test_migracao_passa_por_olt_ocupada_e_quedas_de_canal(subir_olt, monkeypatch):
+    monkeypatch.setenv("OLT_LOTE", "4")
+    monkeypatch.setenv("OLT_DISJUNTOR_FALHAS", "50")
+    uncfg = fake_olt.gerar_seriais(24, PONS, 3)
+    estado = fake_olt.EstadoOLT(dict(uncfg))
+    subir_olt(estado, ocupada=0.1, queda=0.005, semente=7)
+    ocupadas = []
+    registrar = fake_olt._Sessao.registrar
+
+    def contar_ocupada(sessao, onu_id, serial):
+        resposta = registrar(sessao, onu_id, serial)
+        if "busy" in resposta:
+            ocupadas.append(serial)
+        return resposta
+
+    monkeypatch.setattr(fake_olt._Sessao, "registrar", contar_ocupada)
+
+    resultado = migrar(list(uncfg))
+
+    assert resultado["falhas_list"] == []
+    assert resultado["sucessos"] == 24
+    # Cada ONU registrada uma vez só, na PON em que apareceu no uncfg
+    for pon in PONS:
+        assert sorted(estado.onus[pon].values()) == sorted(s for s, p in uncfg.items() if p == pon)
+    assert len(estado.nomes) == 24
+    # Com a semente fixa a OLT recusa alguns registros e derruba o canal algumas vezes (cada queda
+    # é uma sessão nova); tudo passa pelas novas tentativas
+    assert ocupadas
+    assert estado.handshakes > 2
+
+
+def test_retomada_depois_da_verificacao_refaz_so_o_servico(subir_olt, monkeypatch):
+    monkeypatch.setenv("OLT_VERIFICAR", "1")
+    monkeypatch.setenv("OLT_VERIFICAR_INTERVALO", "0.05")
+    monkeypatch.setenv("OLT_VERIFICAR_PRAZO", "0.1")
+    uncfg = fake_olt.gerar_seriais(4, PONS[:1], 9)
+    estado = fake_olt.EstadoOLT(dict(uncfg), fase_nova="LOS")
+    subir_olt(estado)
+
+    primeira = migrar(list(uncfg), retomar=True)
+    assert primeira["sucessos"] == 0
+    assert {falha["tipo_erro"] for falha in primeira["falhas_list"]} == {"fora_do_ar"}
+    registradas = dict(estado.onus[PONS[0]])
+    assert sorted(registradas.values()) == sorted(uncfg)
+
+    # ONUs saíram do uncfg, mas o diário tem o ID de cada uma: a volta não registra de novo
+    estado.fase_nova = "working"
+    segunda = migrar(list(uncfg), retomar=True)
+    assert segunda["falhas_list"] == []
+    assert segunda["sucessos"] == 4
+    assert estado.onus[PONS[0]] == registradas
+
+
+def test_retomada_de_id_reservado_com_a_onu_ja_no_id(subir_olt, ambiente):
+    serial = "ZTEG0000AA01"
+    estado = fake_olt.EstadoOLT(onus={PONS[0]: {5: serial}})
+    subir_olt(estado)
+    # Execução anterior caiu depois de mandar o registro e antes do serviço
+    caminho = str(ambiente / "diario.jsonl")
+    anterior = diario.Diario(caminho)
+    anterior.registrar(serial, diario.ID_RESERVADO, olt="padrao", pon=PONS[0], onu_id=5)
+    anterior.fechar()
+
+    resultado = migrar([serial], retomar=caminho)
+
+    assert resultado["sucessos"] == 1
+    assert estado.onus[PONS[0]] == {5: serial}
+    assert estado.nomes[(PONS[0], 5)] == "cliente-0"
+
+
+def test_retomada_nao_configura_id_que_esta_com_outra_onu(subir_olt, ambiente):
+    serial, outra = "ZTEG0000AA01", "ZTEG0000BB02"
+    estado = fake_olt.EstadoOLT(onus={PONS[0]: {1: outra}})
+    subir_olt(estado)
+    caminho = str(ambiente / "diario.jsonl")
+    anterior = diario.Diario(caminho)
+    anterior.registrar(serial, diario.FALHA, olt="padrao", pon=PONS[0], onu_id=1)
+    anterior.fechar()
+
+    resultado = migrar([serial], retomar=caminho)
+
+    assert resultado["sucessos"] == 0
+    assert "está com a ONU ZTEG0000BB02" in resultado["falhas_list"][0]["motivo"]
+    assert estado.onus[PONS[0]] == {1: outra}
+    assert estado.nomes == {}
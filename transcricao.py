@@ -0,0 +1,47 @@
+import logging
+import os
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Tudo que vai e volta da OLT sai neste logger em DEBUG; não propaga pro log principal (INFO),
+# que fica só com o resumo de cada ONU
+logger = logging.getLogger("transcricao")
+logger.setLevel(logging.DEBUG)
+logger.propagate = False
+
+
+def registrar(host, comandos, saidas):
+    # Só formata o texto se tiver alguém gravando a transcrição
+    if logger.isEnabledFor(logging.DEBUG) and logger.handlers:
+        for comando, saida in zip(comandos, saidas):
+            logger.debug(f"[{host}] {comando}\n{saida}" if saida else f"[{host}] {comando}")
+
+
+class Transcricao:
+    # Arquivo de transcrição de uma execução, rotacionado por tamanho: no máximo
+    # `max_bytes` * (copias + 1) em disco, por maior que seja a planilha
+    def __init__(self, pasta="transcricoes", max_bytes=50 * 1024 * 1024, copias=3):
+        os.makedirs(pasta, exist_ok=True)
+        self.caminho = os.path.join(pasta, f"{datetime.now():%Y%m%d-%H%M%S-%f}.log")
+        self.copias = copias
+        self.handler = RotatingFileHandler(self.caminho, maxBytes=max_bytes, backupCount=copias, encoding="utf-8")
+        self.handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        logger.addHandler(self.handler)
+
+    def fechar(self):
+        logger.removeHandler(self.handler)
+        self.handler.close()
+
+
+def arquivos(caminho, copias=3):
+    # Do pedaço mais antigo (caminho.N) pro atual (caminho)
+    pedacos = [f"{caminho}.{i}" for i in range(copias, 0, -1)] + [caminho]
+    return [p for p in pedacos if os.path.exists(p)]
+
+
+def ler(caminho, copias=3):
+    partes = []
+    for pedaco in arquivos(caminho, copias):
+        with open(pedaco, "rb") as arquivo:
+            partes.append(arquivo.read())
+    return b"".join(partes)
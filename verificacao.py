@@ -0,0 +1,84 @@
+import logging
+import math
+import os
+
+import falhas
+import parsers
+
+# Conferência depois da migração: um "show gpon onu state" por PON confere todas as ONUs que
+# acabaram de ser autorizadas nela (registro, admin state e phase state), repetido até todas
+# ficarem working ou o prazo acabar. OLT_VERIFICAR, OLT_VERIFICAR_INTERVALO e OLT_VERIFICAR_PRAZO
+# são lidos na hora de usar, não no import: o .env só é carregado depois
+INTERVALO = 5.0
+PRAZO = 60.0
+
+FASE_OK = "working"
+ADMIN_OK = "enable"
+
+
+def ligada():
+    return os.getenv("OLT_VERIFICAR", "1") != "0"
+
+
+def comandos(pon):
+    return ["configure terminal", f"show gpon onu state gpon_olt-{pon}", "exit"]
+
+
+def conferir(estados, onus):
+    # estados: saída já parseada (parsers.parse_estado_onus) da PON inteira.
+    # Retorna, por ONU, None (working), ("pendente", motivo) ou ("falha", motivo, tipo).
+    por_id = {estado.onu_id: estado for estado in estados}
+    conferidas = []
+    for onu in onus:
+        estado = por_id.get(onu['onu_id'])
+        if estado is None:
+            conferidas.append(("falha", f"ONU {onu['serial']} não aparece registrada no ID {onu['onu_id']}",
+                               "nao_registrada"))
+        elif (estado.admin or "").lower() != ADMIN_OK:
+            conferidas.append(("falha", f"ONU {onu['serial']} com admin state {estado.admin}", "admin_desabilitada"))
+        elif (estado.fase or "").lower() != FASE_OK:
+            conferidas.append(("pendente", f"ONU {onu['serial']} em {estado.fase}"))
+        else:
+            conferidas.append(None)
+    return conferidas
+
+
+def passos_verificacao(pon, onus, intervalo=None, prazo=None):
+    # Gerador sem I/O, no mesmo esquema do app.passos_autorizacao: `yield ("verificacao", comandos, False)`
+    # pede a leitura da PON e `yield ("espera", segundos, None)` a pausa entre leituras.
+    # ONU que já convergiu (working ou falha definitiva) sai das leituras seguintes.
+    # Retorna uma lista de (motivo, tipo) na ordem de `onus`, com None pras que ficaram working.
+    intervalo = float(os.getenv("OLT_VERIFICAR_INTERVALO", INTERVALO)) if intervalo is None else intervalo
+    prazo = float(os.getenv("OLT_VERIFICAR_PRAZO", PRAZO)) if prazo is None else prazo
+    leituras = 1 + (math.ceil(prazo / intervalo) if intervalo > 0 else 0)
+    resultados = [None] * len(onus)
+    pendentes = {i: None for i in range(len(onus))}
+
+    for leitura in range(leituras):
+        if leitura:
+            yield "espera", intervalo, None
+        try:
+            saidas = yield "verificacao", comandos(pon), False
+        except Exception as e:
+            # A leitura já passou pelas novas tentativas do inventário; vale a próxima rodada
+            logging.warning(f"Erro ao conferir as ONUs da PON {pon}: {e}")
+            for i in pendentes:
+                pendentes[i] = (f"Erro ao conferir a ONU {onus[i]['serial']}: {e}", falhas.tipo(e))
+            continue
+        indices = list(pendentes)
+        estados = parsers.parse_estado_onus(saidas[1])
+        for i, conferida in zip(indices, conferir(estados, [onus[i] for i in indices])):
+            if conferida is None:
+                del pendentes[i]
+            elif conferida[0] == "falha":
+                del pendentes[i]
+                resultados[i] = conferida[1:]
+            else:
+                pendentes[i] = (conferida[1], "fora_do_ar")
+        if not pendentes:
+            break
+
+    for i, motivo in pendentes.items():
+        motivo, tipo = motivo
+        resultados[i] = (f"{motivo} depois de {prazo:.0f}s", tipo)
+    return resultados
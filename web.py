@@ -1,20 +1,69 @@
 import streamlit as st
-import pandas as pd
 import os
 import sys
 import logging
-from io import StringIO
-from PIL import Image
+import time
+from itertools import islice
+from dotenv import load_dotenv
 
 # Configuração da página com favicon personalizado podendo ser icone ou um png que esteja em /assets
 st.set_page_config(page_title="Migração de ONUs", page_icon="🚀", layout="wide")
 
 # diretório do script ao PATH para importar o app.py
 sys.path.append(os.path.dirname(__file__))
-import app
+# O Streamlit roda este script inteiro a cada clique: aqui só entra o que é leve. O app (paramiko,
+# SSH), o pandas e o openpyxl são carregados na primeira vez que alguém precisa deles.
+import conversor
+import fila
+import leitor
+import metricas
+import progresso
+import transcricao
 
-# Configuração do logging pra ver a bagaceira
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+LINHAS_PREVIEW = 100
+INTERVALO_ATUALIZACAO = 1
+LINHAS_LOG = 300
+ASSETS = os.path.join(os.path.dirname(__file__), "assets")
+
+@st.cache_resource
+def configurar():
+    # Uma vez por processo, não a cada rerun: .env, logging, /metrics e a fila do worker (se houver)
+    load_dotenv()
+    # Configuração do logging pra ver a bagaceira
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Endpoint Prometheus opcional (/metrics e /metrics.json)
+    if os.getenv("METRICAS_PORTA"):
+        metricas.servir(int(os.getenv("METRICAS_PORTA")))
+    # Com OLT_FILA a tela só enfileira e acompanha; quem migra é o worker.py
+    return fila.Fila() if os.getenv("OLT_FILA") else None
+
+@st.cache_data
+def imagem(nome):
+    # Bytes do arquivo em /assets, lidos do disco uma vez só
+    caminho = os.path.join(ASSETS, nome)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "rb") as arquivo:
+        return arquivo.read()
+
+def tabela(linhas, colunas=None):
+    # pandas só entra quando a primeira tabela aparece na tela
+    import pandas as pd
+    st.dataframe(pd.DataFrame(linhas, columns=colunas))
+
+def processar_planilha(*args, **kwargs):
+    # Migração nesta mesma instância (sem worker): o app só é importado quando uma começa
+    import app
+    return app.processar_planilha(*args, **kwargs)
+
+def iniciar_migracao(conteudo, **opcoes):
+    fila_tarefas = configurar()
+    if fila_tarefas is not None:
+        return fila_tarefas.enviar(conteudo, **opcoes)
+    # A migração roda numa thread e a tela só acompanha o progresso, direto da memória sem arquivo temporário
+    return progresso.MigracaoEmSegundoPlano(processar_planilha, conteudo, **opcoes).iniciar()
+
+configurar()
 
 # Função para criar o rodapé frufru
 def footer():
@@ -40,11 +89,80 @@ def footer():
         unsafe_allow_html=True
     )
 
+def mostrar_migracao(migracao):
+    retrato = migracao.progresso.retrato()
+
+    if retrato["total_estimado"]:
+        st.progress(min(retrato["processadas"] / retrato["total_estimado"], 1.0))
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Processadas", f"{retrato['processadas']}/{retrato['total_estimado'] or '?'}")
+    c2.metric("Sucessos", retrato["sucessos"])
+    c3.metric("Falhas", retrato["falhas"])
+    c4.metric("ONUs/s", f"{retrato['vazao']:.2f}")
+
+    if getattr(migracao, "estado", None) == fila.PENDENTE:
+        st.info("Na fila, esperando o worker... ⏳")
+    elif not migracao.concluida():
+        eta = f"{retrato['eta']:.0f}s" if retrato["eta"] is not None else "calculando"
+        st.info(f"Migrando... ⏳ ONU atual: {retrato['serial_atual'] or '-'} | Tempo restante: {eta}")
+    elif "error" in migracao.resultado:
+        st.error(f"Erro ao processar a planilha: {migracao.resultado['error']}")
+    elif migracao.resultado.get("simulacao"):
+        mostrar_plano(migracao.resultado)
+    else:
+        resultado = migracao.resultado
+        st.success(f"Migração concluída! Total: {resultado['total']}, Sucessos: {resultado['sucessos']}, Falhas: {resultado['falhas']}")
+        mostrar_metricas(resultado.get("metricas"))
+
+    # Exibir logs: só o final na tela; a conversa inteira com a OLT fica na transcrição
+    st.subheader("Logs do Processo:")
+    st.text_area("", value=migracao.logs.texto(LINHAS_LOG), height=300)
+
+    caminho = migracao.resultado.get("transcricao") if migracao.concluida() and migracao.resultado else None
+    if caminho:
+        # O arquivo só é lido do disco quando alguém pede
+        if st.session_state.get("transcricao_pronta") != caminho:
+            if st.button("Preparar transcrição completa 📄"):
+                st.session_state["transcricao_pronta"] = caminho
+                st.rerun()
+        else:
+            st.download_button(
+                label="Baixar transcrição completa",
+                data=transcricao.ler(caminho),
+                file_name=os.path.basename(caminho),
+                mime="text/plain",
+            )
+
+def mostrar_plano(resultado):
+    # Simulação: nada foi escrito na OLT, só o que seria feito e o que ficou de fora
+    st.success(f"Plano pronto! Total: {resultado['total']}, Prontas pra migrar: {resultado['planejadas']}, "
+               f"Fora do plano: {resultado['falhas']}")
+    colunas = ["linha", "serial", "name", "olt", "pon", "onu_id", "perfil"]
+    tabela(resultado["plano"], colunas)
+    if resultado["falhas_list"]:
+        st.write("Linhas que não vão pra OLT:")
+        tabela(resultado["falhas_list"], ["serial", "name", "olt", "motivo"])
+    st.download_button(
+        label="Baixar script do plano",
+        data=resultado["script"],
+        file_name="plano_migracao.txt",
+        mime="text/plain",
+    )
+
+def mostrar_metricas(relatorio):
+    # Onde o tempo da execução foi parar: por etapa e as PONs/OLTs mais lentas
+    if not relatorio or not relatorio["etapas"]:
+        return
+    with st.expander("Tempos da execução ⏱️"):
+        tabela(relatorio["etapas"])
+        st.write("Mais lentas (tempo total por etapa e PON/OLT):")
+        tabela(relatorio["series"][:20])
+
 # Sidebar
 with st.sidebar:
-    logo_path = os.path.join(os.path.dirname(__file__), "assets", "logo.png")
-    if os.path.exists(logo_path):
-        logo = Image.open(logo_path)
+    logo = imagem("logo.png")
+    if logo is not None:
         st.image(logo, use_column_width=True)
     else:
         st.warning("Logo não encontrado. Certifique-se de que o arquivo logo.png está em /assets.")
@@ -59,51 +177,42 @@ if page == "Migração de ONUs":
     col1, col2, col3 = st.columns([0.9, 4, 10])
     
     with col1:
-        view_path = os.path.join(os.path.dirname(__file__), "assets", "view.png")
-        if os.path.exists(view_path):
-            view_image = Image.open(view_path)
+        view_image = imagem("view.png")
+        if view_image is not None:
             st.image(view_image, width=300)
         else:
             st.warning("Imagem 'view.png' não encontrada. Certifique-se de que o arquivo está em /assets.")
     
     with col3:
-        uploaded_file = st.file_uploader("Envie a planilha de ONUs (XLSX) 📤", type=["xlsx"])
+        uploaded_file = st.file_uploader("Envie a planilha de ONUs (XLSX, CSV ou JSONL) 📤", type=["xlsx", "csv", "jsonl"])
 
     if uploaded_file is not None:
         st.success("Arquivo carregado com sucesso! ✅")
         
-        # Exibir preview dos dados da planilha
-        df = pd.read_excel(uploaded_file)
-        st.write("Preview dos dados:")
-        st.dataframe(df)
+        # Preview só com as primeiras linhas, a planilha inteira é lida sob demanda na migração
+        conteudo = uploaded_file.getvalue()
+        colunas, linhas = leitor.previa(conteudo, n=LINHAS_PREVIEW, nome=uploaded_file.name)
+        st.write(f"Preview dos dados (primeiras {LINHAS_PREVIEW} linhas):")
+        tabela(linhas, colunas)
+
+        migracao = st.session_state.get("migracao")
+        em_andamento = migracao is not None and not migracao.concluida()
 
-        if st.button("Iniciar Migração 🔄"):
+        simular = st.checkbox("Só planejar (não altera nada na OLT)")
+        if st.button("Planejar 🧭" if simular else "Iniciar Migração 🔄", disabled=em_andamento):
             st.info("Iniciando processo de migração... ⏳")
-            # Salvar o arquivo temporariamente no diretorio do script
-            with open("temp_planilha.xlsx", "wb") as f:
-                f.write(uploaded_file.getvalue())
-            
-            # captura de logs
-            log_capture_string = StringIO()
-            ch = logging.StreamHandler(log_capture_string)
-            ch.setLevel(logging.INFO)
-            logging.getLogger().addHandler(ch)
-
-            # Processar a planilha e entender a situação BO
-            resultado = app.processar_planilha("temp_planilha.xlsx")
-
-            # Remover o arquivo temporário pra evitar dor de cabeça posterior
-            os.remove("temp_planilha.xlsx")
-
-            # Exibir resultados
-            if "error" in resultado:
-                st.error(f"Erro ao processar a planilha: {resultado['error']}")
-            else:
-                st.success(f"Migração concluída! Total: {resultado['total']}, Sucessos: {resultado['sucessos']}, Falhas: {resultado['falhas']}")
-
-            # Exibir logs
-            st.subheader("Logs do Processo:")
-            st.text_area("", value=log_capture_string.getvalue(), height=300)
+
+            migracao = iniciar_migracao(
+                conteudo,
+                formato=leitor.detectar_formato(conteudo, uploaded_file.name),
+                retomar=True,
+                simular=simular,
+            )
+            st.session_state["migracao"] = migracao
+            st.session_state["migracao_pagina"] = page
+
+        if migracao is not None and st.session_state.get("migracao_pagina") == page:
+            mostrar_migracao(migracao)
 
     else:
         st.warning("Por favor, faça o upload de uma planilha para iniciar o processo.")
@@ -117,25 +226,43 @@ elif page == "Gerar XLSX":
         uploaded_json = st.file_uploader("Envie o arquivo JSON exportado pela OLT UBIQUITI", type=["json"])
         
         if uploaded_json:
-            df = pd.read_json(uploaded_json)
-            df = df[['serial', 'name']]
-            
-            st.write("Dados extraídos:")
-            st.dataframe(df)
-            
-            if st.button("Gerar XLSX"):
-                output = "ONUs_migracao.xlsx"
-                df.to_excel(output, index=False)
-                
-                st.success(f"Arquivo gerado: {output}")
-                
-                with open(output, "rb") as file:
-                    st.download_button(
-                        label="Baixar arquivo XLSX",
-                        data=file,
-                        file_name=output,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+            # O export é lido aos pedaços: a prévia só olha o começo e o XLSX é montado em memória,
+            # um por usuário, sem arquivo no diretório compartilhado
+            conteudo = uploaded_json.getvalue()
+            st.write(f"Dados extraídos (primeiras {LINHAS_PREVIEW} ONUs, serial normalizado e sem repetidos):")
+            tabela(list(islice(conversor.onus(conteudo), LINHAS_PREVIEW)), conversor.COLUNAS)
+
+            migracao = st.session_state.get("migracao")
+            em_andamento = migracao is not None and not migracao.concluida()
+            b1, b2 = st.columns(2)
+
+            if b1.button("Gerar XLSX"):
+                contagem = {}
+                dados = conversor.gerar_xlsx(conteudo, contagem=contagem)
+                st.success(f"Arquivo gerado com {contagem['convertidos']} ONUs "
+                           f"({contagem['repetidos']} repetidas e {contagem['sem_serial']} sem serial ignoradas)")
+                st.download_button(
+                    label="Baixar arquivo XLSX",
+                    data=dados,
+                    file_name="ONUs_migracao.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
+            # Direto pra migração, sem passar por XLSX
+            if b2.button("Migrar direto 🔄", disabled=em_andamento):
+                migracao = iniciar_migracao(b"".join(conversor.gerar_jsonl(conteudo)), formato="jsonl",
+                                            retomar=True)
+                st.session_state["migracao"] = migracao
+                st.session_state["migracao_pagina"] = page
+
+            if migracao is not None and st.session_state.get("migracao_pagina") == page:
+                mostrar_migracao(migracao)
 
 #  rodapé frufru
-footer()
\ No newline at end of file
+footer()
+
+# Enquanto a migração roda em segundo plano, a página se redesenha sozinha a cada segundo
+migracao = st.session_state.get("migracao")
+if migracao is not None and not migracao.concluida() and st.session_state.get("migracao_pagina") == page:
+    time.sleep(INTERVALO_ATUALIZACAO)
+    st.rerun()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import app
+import fila
+import leitor
+import metricas
+from progresso import MigracaoEmSegundoPlano
+
+# Worker sem tela: pega as migrações da fila (fila.py), roda o processar_planilha e publica
+# o andamento pra tela ler. Também enfileira e consulta tarefas pela linha de comando.
+
+INTERVALO_FILA = 2
+INTERVALO_PUBLICACAO = 1
+
+
+def executar(fila_tarefas, id, arquivo, opcoes):
+    logging.info(f"Tarefa {id}: migração começou")
+    migracao = MigracaoEmSegundoPlano(app.processar_planilha, arquivo, **opcoes).iniciar()
+    while not migracao.concluida():
+        fila_tarefas.publicar(id, migracao.progresso.retrato(), migracao.logs.texto(fila.LINHAS_LOGS))
+        time.sleep(INTERVALO_PUBLICACAO)
+    fila_tarefas.concluir(id, migracao.resultado, migracao.progresso.retrato(), migracao.logs.texto(fila.LINHAS_LOGS))
+    logging.info(f"Tarefa {id}: migração terminou")
+    return migracao.resultado
+
+
+def rodar(fila_tarefas, uma=False):
+    worker = fila.identificador()
+    logging.info(f"Worker {worker} esperando migrações em {fila_tarefas.caminho}")
+    while True:
+        tarefa = fila_tarefas.pegar(worker)
+        if tarefa is None:
+            if uma:
+                return
+            time.sleep(INTERVALO_FILA)
+            continue
+        executar(fila_tarefas, *tarefa)
+        if uma:
+            return
+
+
+def resumo(tarefa):
+    retrato = tarefa["progresso"] or {}
+    return (f"{tarefa['id']:>5}  {tarefa['estado']:<9}  processadas={retrato.get('processadas', 0)}/"
+            f"{retrato.get('total_estimado') or '?'}  sucessos={retrato.get('sucessos', 0)}  "
+            f"falhas={retrato.get('falhas', 0)}  {tarefa['worker'] or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da migração de ONUs (fila em SQLite)")
+    parser.add_argument("--fila", help=f"arquivo da fila (padrão: OLT_FILA ou {fila.CAMINHO_PADRAO})")
+    comandos = parser.add_subparsers(dest="comando")
+    rodar_parser = comandos.add_parser("rodar", help="roda as migrações da fila (padrão)")
+    rodar_parser.add_argument("--uma", action="store_true", help="roda no máximo uma tarefa e sai")
+    enviar_parser = comandos.add_parser("enviar", help="coloca uma planilha na fila")
+    enviar_parser.add_argument("planilha", help="XLSX, CSV ou JSONL")
+    enviar_parser.add_argument("--simular", action="store_true", help="só planeja, sem alterar nada na OLT")
+    enviar_parser.add_argument("--esperar", action="store_true", help="espera a tarefa terminar e mostra o resultado")
+    estado_parser = comandos.add_parser("estado", help="mostra as últimas tarefas, ou uma só")
+    estado_parser.add_argument("id", nargs="?", type=int)
+    args = parser.parse_args()
+
+    fila_tarefas = fila.Fila(args.fila)
+
+    if args.comando == "enviar":
+        with open(args.planilha, "rb") as arquivo:
+            conteudo = arquivo.read()
+        tarefa = fila_tarefas.enviar(conteudo, formato=leitor.detectar_formato(conteudo, args.planilha),
+                                     retomar=True, simular=args.simular)
+        print(f"Tarefa {tarefa.id} na fila")
+        if not args.esperar:
+            return 0
+        while not tarefa.concluida():
+            time.sleep(INTERVALO_PUBLICACAO)
+        resultado = tarefa.resultado
+        if "error" in resultado:
+            print(f"Erro: {resultado['error']}")
+            return 1
+        chave = "planejadas" if resultado.get("simulacao") else "sucessos"
+        print(f"total={resultado['total']} {chave}={resultado[chave]} falhas={resultado['falhas']}")
+        return 0 if not resultado["falhas"] else 2
+
+    if args.comando == "estado":
+        if args.id is None:
+            for tarefa in fila_tarefas.listar():
+                print(resumo(tarefa))
+            return 0
+        tarefa = fila_tarefas.consultar(args.id)
+        if tarefa is None:
+            print(f"Tarefa {args.id} não existe")
+            return 1
+        print(resumo(tarefa))
+        if tarefa["resultado"] is not None:
+            print(json.dumps(tarefa["resultado"], ensure_ascii=False, indent=2))
+        return 0
+
+    # Métricas do processo que de fato conversa com a OLT
+    if os.getenv("METRICAS_PORTA"):
+        metricas.servir(int(os.getenv("METRICAS_PORTA")))
+    rodar(fila_tarefas, uma=getattr(args, "uma", False))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())